@@ -0,0 +1,102 @@
+"""
+Answers a batch of searches against one dataset - queries are read
+from a .jsonl file, one json object per line with the same parameters
+as search_server.py accepts:
+  {"origin": "IUT", "destination": "IUQ", "bags": 1, "return": true}
+
+Results are written one per line in the order of the queries - json
+list of flight combinations, or {"error": reason} when the query
+is not valid. Empty lines are skipped.
+
+The graph is loaded (and the delta applied) once before the pool
+of workers is started and shared with them, see search_workers.py.
+
+how to run it:
+python3 -m "solution" "example/example2.csv" --batch=queries.jsonl
+"""
+import json
+import os
+import sys
+from typing import Iterable, Iterator, Optional, TextIO
+
+from helper_functions import *
+from search_workers import set_worker_graph, start_workers, worker_graph
+from visit_airports import Graph, Query
+
+# how many queries are sent to a worker at once - queries take
+# very different time, small chunks keep the workers busy evenly
+BATCH_CHUNK_SIZE = 8
+
+
+def answer_query(line: str) -> str:
+    """Result of one query (line of the batch) as one line of json"""
+    try:
+        parameters = json.loads(line)
+    except ValueError:
+        return json.dumps({"error": "Query is not valid json"})
+
+    if not isinstance(parameters, dict):
+        return json.dumps({"error": "Query has to be a json object"})
+
+    try:
+        query = Query(**search_requirements(parameters))
+    except InvalidRequirements as error:
+        return json.dumps({"error": str(error)})
+
+    return json.dumps(worker_graph().search(query))
+
+
+def read_queries(file: TextIO) -> Iterator[str]:
+    """Non empty lines of the batch, read lazily"""
+    for line in file:
+        if line.strip():
+            yield line
+
+
+def answer_queries(queries: Iterable[str],
+                   graph: Graph,
+                   dataset: str,
+                   index: Optional[str] = None,
+                   processes: Optional[int] = None,
+                   delta: Optional[str] = None) -> Iterator[str]:
+    """
+    Results of <queries> in the same order, answered by <processes>
+    workers (default = number of cpus) searching <graph> - see
+    start_workers() for the other parameters.
+    """
+    processes = processes or os.cpu_count() or 1
+
+    if processes == 1:
+        # no need for workers
+        set_worker_graph(graph)
+        yield from map(answer_query, queries)
+        return
+
+    with start_workers(graph, processes, dataset, index, delta) as pool:
+        # imap keeps the order of the queries and reads them lazily
+        yield from pool.imap(answer_query, queries, BATCH_CHUNK_SIZE)
+
+
+def run_batch(batch_filename: str,
+              graph: Graph,
+              dataset: str,
+              index: Optional[str] = None,
+              processes: Optional[int] = None,
+              output: Optional[TextIO] = None,
+              delta: Optional[str] = None) -> None:
+    """
+    Writes results of all queries of the batch file to <output>
+    (default=stdout), see answer_queries()
+    """
+    if output is None:
+        output = sys.stdout
+
+    with open(batch_filename) as file:
+        for result in answer_queries(read_queries(file),
+                                     graph,
+                                     dataset,
+                                     index,
+                                     processes,
+                                     delta):
+            output.write(result)
+            output.write("\n")
@@ -0,0 +1,7 @@
+"""
+Benchmarks of loading and searching datasets.
+
+  bench_loading     - line by line vs. chunked loading of a dataset
+  generate_dataset  - seeded generator of datasets of any size
+  run_benchmark     - times phases of a search and stores them as json
+"""
@@ -0,0 +1,87 @@
+"""
+Compares loading of a dataset line by line (FlightTable.add_flight)
+with the chunked column-wise loader (load_flights.load_flights).
+
+how to run it:
+python3 -m "benchmarks.bench_loading" --scale=1000
+"""
+import argparse
+import os
+import tempfile
+from time import perf_counter
+
+from load_flights import load_flights
+from process_airports import FlightTable
+
+DEFAULT_DATASET = os.path.join("example", "example3.csv")
+
+
+def scale_dataset(csv_filename: str, scale: int, output_filename: str) -> int:
+    """
+    Writes the flights of <csv_filename> <scale> times into
+    <output_filename>, returns number of written flights.
+    """
+    with open(csv_filename, "r") as file:
+        header = file.readline()
+        lines = [line if line.endswith("\n") else line + "\n"
+                 for line in file if line.strip()]
+
+    with open(output_filename, "w") as file:
+        file.write(header)
+        for _ in range(scale):
+            file.writelines(lines)
+
+    return len(lines) * scale
+
+
+def load_line_by_line(csv_filename: str) -> FlightTable:
+    flights = FlightTable()
+
+    with open(csv_filename, "r") as file:
+        flights_file = file.readlines()
+
+    flight_categories = flights_file[0].strip().split(",")
+    for line in flights_file[1:]:
+        flights.add_flight(line, flight_categories)
+
+    return flights
+
+
+def load_chunked(csv_filename: str) -> FlightTable:
+    flights = FlightTable()
+    load_flights(csv_filename, flights)
+    return flights
+
+
+def measure(name: str, function, csv_filename: str, flights_count: int):
+    start = perf_counter()
+    flights = function(csv_filename)
+    elapsed = perf_counter() - start
+
+    assert len(flights) == flights_count
+    print(f"{name:<14} {elapsed:8.3f} s "
+          f"{flights_count / elapsed:12.0f} flights/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", type=str, default=DEFAULT_DATASET)
+    parser.add_argument("--scale", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_filename = os.path.join(directory, "scaled.csv")
+        flights_count = scale_dataset(args.dataset, args.scale, csv_filename)
+        print(f"{args.dataset} x {args.scale} = {flights_count} flights")
+
+        line_by_line = measure("line by line", load_line_by_line,
+                               csv_filename, flights_count)
+        chunked = measure("chunked", load_chunked,
+                          csv_filename, flights_count)
+
+    print(f"speedup {line_by_line / chunked:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Generates a dataset of flights in the same format as example/*.csv.
+
+Airports are spread on a square map, flight time and price grow with
+the distance. <hub_concentration> of the flights start or end in one
+of the <hubs> airports, the remaining ones connect random airports.
+The same seed always gives the same dataset.
+
+how to run it:
+python3 -m "benchmarks.generate_dataset" flights.csv --airports=50 \
+    --flights-per-day=500 --days=7 --seed=1
+"""
+import argparse
+import math
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from helper_functions import FLIGHT_INFORMATION, TIME_FORMAT
+
+START = datetime(2021, 9, 1)
+
+# flights depart every 5 minutes at most
+MINUTES_STEP = 5
+
+# size of the map in minutes of flight
+MAP_SIZE = 300
+
+CARRIERS = ["CC", "JT", "YL", "ZH", "NB"]
+
+
+def airport_codes(random_generator: random.Random, count: int) -> List[str]:
+    """<count> different airport codes"""
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    codes = set()
+
+    while len(codes) < count:
+        codes.add("".join(random_generator.choice(letters)
+                          for _ in range(3)))
+
+    return sorted(codes)
+
+
+def flight_route(random_generator: random.Random,
+                 airports: int,
+                 hubs: int,
+                 hub_concentration: float) -> Tuple[int, int]:
+    """Origin and destination of a flight as indices of airports"""
+    if random_generator.random() < hub_concentration:
+        hub = random_generator.randrange(hubs)
+        other = random_generator.randrange(airports - 1)
+        if other >= hub:
+            other += 1
+
+        if random_generator.random() < 0.5:
+            return hub, other
+        return other, hub
+
+    origin, destination = random_generator.sample(range(airports), 2)
+    return origin, destination
+
+
+def generate_dataset(csv_filename: str,
+                     airports: int = 50,
+                     flights_per_day: int = 500,
+                     days: int = 7,
+                     hubs: int = 3,
+                     hub_concentration: float = 0.6,
+                     seed: int = 1) -> int:
+    """Writes the dataset to <csv_filename>, returns number of flights"""
+    if airports < 2 or not 0 < hubs <= airports:
+        raise ValueError("Dataset needs at least 2 airports and 1 hub")
+
+    random_generator = random.Random(seed)
+    codes = airport_codes(random_generator, airports)
+    positions = [(random_generator.uniform(0, MAP_SIZE),
+                  random_generator.uniform(0, MAP_SIZE))
+                 for _ in range(airports)]
+
+    flights = []
+
+    for day in range(days):
+        for _ in range(flights_per_day):
+            origin, destination = flight_route(random_generator,
+                                               airports,
+                                               hubs,
+                                               hub_concentration)
+
+            distance = math.dist(positions[origin], positions[destination])
+            duration = MINUTES_STEP * round((30 + distance) / MINUTES_STEP)
+
+            departure = START + timedelta(
+                days=day,
+                minutes=MINUTES_STEP * random_generator.randrange(
+                    24 * 60 // MINUTES_STEP))
+            arrival = departure + timedelta(minutes=duration)
+
+            flights.append({
+                "flight_no": random_generator.choice(CARRIERS)
+                + str(random_generator.randrange(100, 1000)),
+                "origin": codes[origin],
+                "destination": codes[destination],
+                "departure": departure.strftime(TIME_FORMAT),
+                "arrival": arrival.strftime(TIME_FORMAT),
+                "base_price": str(float(round(
+                    duration * random_generator.uniform(0.2, 0.6)))),
+                "bag_price": str(random_generator.choice([9, 10, 11, 12])),
+                "bags_allowed": str(random_generator.choice([1, 2, 2]))
+            })
+
+    flights.sort(key=lambda flight: flight["departure"])
+
+    with open(csv_filename, "w") as file:
+        file.write(",".join(FLIGHT_INFORMATION) + "\n")
+
+        for flight in flights:
+            file.write(",".join(flight[category]
+                                for category in FLIGHT_INFORMATION) + "\n")
+
+    return len(flights)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--airports", type=int, default=50)
+    parser.add_argument("--flights-per-day", type=int, default=500)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--hubs", type=int, default=3)
+    parser.add_argument("--hub-concentration",
+                        type=float,
+                        default=0.6,
+                        help="Part of flights from or to a hub (0 - 1)")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def dataset_parameters(args: argparse.Namespace) -> Dict:
+    return {
+        "airports": args.airports,
+        "flights_per_day": args.flights_per_day,
+        "days": args.days,
+        "hubs": args.hubs,
+        "hub_concentration": args.hub_concentration,
+        "seed": args.seed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generates a dataset of flights")
+    parser.add_argument("output", type=str, help="Path to the .csv dataset")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    flights = generate_dataset(args.output, **dataset_parameters(args))
+    print(f"{args.output}: {flights} flights")
+
+
+if __name__ == "__main__":
+    main()
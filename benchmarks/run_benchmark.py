@@ -0,0 +1,306 @@
+"""
+Times phases of searching a generated dataset (see generate_dataset.py):
+loading of the .csv file, building of the departure index, searching,
+formatting and serialization of the results.
+
+Results are printed and stored as json (with the current git commit),
+so they can be compared with results of another commit. Searches count
+expanded airports and flights looked at (see search_stats.py), searches
+with bounds (--max-legs, ...) can be compared with unbounded ones.
+
+how to run it:
+python3 -m "benchmarks.run_benchmark" --flights-per-day=500 \
+    --output=results.json
+python3 -m "benchmarks.run_benchmark" --flights-per-day=500 \
+    --compare=results.json
+python3 -m "benchmarks.run_benchmark" --flights-per-day=500 \
+    --max-legs=3 --max-travel-time=720 --compare=results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import tracemalloc
+from json import dumps
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.generate_dataset import add_arguments, dataset_parameters, \
+    generate_dataset
+from flights_index import Snapshot
+from helper_functions import SEARCH_BOUNDS
+from load_flights import load_flights
+from process_airports import DepartureIndex, FlightCombinations, \
+    FlightTable
+from search_stats import SearchStats
+from visit_airports import Graph, Query
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+# phases of one benchmark in the order they run
+PHASES = ["load", "index", "search", "format", "serialize"]
+
+# counters of the searches which are printed
+COUNTERS = ["nodes_expanded", "candidates", "paths_found"]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"],
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def peak_rss_kb() -> Optional[int]:
+    """The most memory the process has used so far"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class PhaseTimer:
+    """Measures time and optionally peak memory of phases"""
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.seconds: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.peak_bytes: Dict[str, int] = dict.fromkeys(PHASES, 0)
+
+    def measure(self, phase: str, function: Callable, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+
+        start = perf_counter()
+        result = function(*args, **kwargs)
+        self.seconds[phase] += perf_counter() - start
+
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.peak_bytes[phase] = max(self.peak_bytes[phase], peak)
+
+        return result
+
+
+def per_second(count: int, seconds: float) -> Optional[float]:
+    """None when the phase took no measurable time"""
+    if seconds <= 0:
+        return None
+    return count / seconds
+
+
+def load(csv_filename: str) -> Tuple[FlightTable, List[str]]:
+    flights = FlightTable()
+    flight_categories = load_flights(csv_filename, flights)
+    return flights, flight_categories
+
+
+def sample_queries(graph: Graph,
+                   count: int,
+                   seed: int,
+                   bounds: Optional[Dict] = None) -> List[Query]:
+    """
+    Random searches between airports of the graph, the same for a seed,
+    all of them with <bounds> (see search_bounds.py)
+    """
+    random_generator = random.Random(seed)
+    airports = sorted(graph.flights.airports)
+    queries = []
+
+    for _ in range(count):
+        origin, destination = random_generator.sample(airports, 2)
+        queries.append(Query(origin=origin,
+                             destination=destination,
+                             bags=random_generator.choice([0, 1, 2]),
+                             **(bounds or dict())))
+
+    return queries
+
+
+def search(graph: Graph, query: Query) -> FlightCombinations:
+    flight_combinations = graph.new_combinations(query)
+    for origin, destination, _, _ in query.journeys():
+        graph.visit_all_vertices(origin,
+                                 destination,
+                                 query,
+                                 flight_combinations)
+    return flight_combinations
+
+
+def run_benchmark(csv_filename: str,
+                  searches: int,
+                  seed: int,
+                  trace_memory: bool = False,
+                  bounds: Optional[Dict] = None) -> Dict:
+    timer = PhaseTimer(trace_memory)
+
+    flights, flight_categories = timer.measure("load", load, csv_filename)
+    departure_index = timer.measure("index", DepartureIndex.build, flights)
+
+    # only counters of the stats are used, phases are timed by the timer
+    stats = SearchStats()
+    graph = Graph(snapshot=Snapshot(flights,
+                                    flight_categories,
+                                    departure_index),
+                  stats=stats)
+
+    combinations_count = 0
+    output_bytes = 0
+
+    for query in sample_queries(graph, searches, seed, bounds):
+        flight_combinations = timer.measure("search", search, graph, query)
+        combinations = timer.measure("format",
+                                     flight_combinations.sorted_combinations)
+        output = timer.measure("serialize", dumps, combinations, indent=4)
+
+        combinations_count += len(combinations)
+        output_bytes += len(output)
+
+    seconds = timer.seconds
+    return {
+        "flights": len(flights),
+        "searches": searches,
+        "combinations": combinations_count,
+        "output_bytes": output_bytes,
+        "seconds": seconds,
+        "throughput": {
+            "load_flights_per_s": per_second(len(flights), seconds["load"]),
+            "index_flights_per_s": per_second(len(flights),
+                                              seconds["index"]),
+            "searches_per_s": per_second(searches, seconds["search"]),
+            "combinations_per_s":
+                per_second(combinations_count,
+                           seconds["format"] + seconds["serialize"])
+        },
+        "counters": {counter: stats.counters[counter]
+                     for counter in COUNTERS},
+        "peak_bytes": timer.peak_bytes if trace_memory else None,
+        "peak_rss_kb": peak_rss_kb()
+    }
+
+
+def print_results(results: Dict, previous: Optional[Dict] = None) -> None:
+    print(f"{results['flights']} flights, {results['searches']} searches, "
+          f"{results['combinations']} combinations")
+
+    for phase in PHASES:
+        seconds = results["seconds"][phase]
+        line = f"{phase:<10} {seconds:9.3f} s"
+
+        if previous is not None and previous["seconds"].get(phase):
+            line += f" {seconds / previous['seconds'][phase]:7.2f}x"
+
+        if results["peak_bytes"] is not None:
+            line += f" {results['peak_bytes'][phase] / (1 << 20):9.1f} MiB"
+
+        print(line)
+
+    for name, value in results["throughput"].items():
+        if value is None:
+            print(f"{name:<22} {'-':>14}")
+        else:
+            print(f"{name:<22} {value:14.0f}")
+
+    # results of older commits do not have counters
+    previous_counters = (previous or dict()).get("counters", dict())
+
+    for name, value in results["counters"].items():
+        line = f"{name:<22} {value:14d}"
+
+        if previous_counters.get(name):
+            line += f" {value / previous_counters[name]:7.2f}x"
+
+        print(line)
+
+    if results["peak_rss_kb"] is not None:
+        print(f"peak rss {results['peak_rss_kb'] / 1024:.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times phases of searching a generated dataset")
+    add_arguments(parser)
+    parser.add_argument("--dataset",
+                        type=str,
+                        default=None,
+                        help="Use this .csv dataset instead of generating one")
+    parser.add_argument("--searches", type=int, default=20)
+    parser.add_argument("--max-legs", type=int, default=None)
+    parser.add_argument("--max-travel-time",
+                        type=int,
+                        default=None,
+                        help="In minutes")
+    parser.add_argument("--max-price", type=float, default=None)
+    parser.add_argument("--min-layover",
+                        type=int,
+                        default=None,
+                        help="In minutes")
+    parser.add_argument("--max-layover",
+                        type=int,
+                        default=None,
+                        help="In minutes")
+    parser.add_argument("--trace-memory",
+                        action="store_true",
+                        help="Measure peak memory of every phase "
+                             "with tracemalloc (slower)")
+    parser.add_argument("--output",
+                        type=str,
+                        default=None,
+                        help="Path to a json file the results are stored to")
+    parser.add_argument("--compare",
+                        type=str,
+                        default=None,
+                        help="Path to json results of a previous run")
+    args = parser.parse_args()
+
+    if args.searches < 1:
+        parser.error("--searches has to be a positive number")
+
+    # bounds of all searches, see search_bounds.py
+    bounds = {bound: getattr(args, bound)
+              for bound in SEARCH_BOUNDS
+              if getattr(args, bound) is not None}
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_filename = args.dataset
+        if csv_filename is None:
+            csv_filename = os.path.join(directory, "generated.csv")
+            generate_dataset(csv_filename, **dataset_parameters(args))
+
+        results = run_benchmark(csv_filename,
+                                args.searches,
+                                args.seed,
+                                args.trace_memory,
+                                bounds)
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "dataset": args.dataset or dataset_parameters(args),
+        "bounds": bounds,
+        **results
+    }
+
+    previous = None
+    if args.compare is not None:
+        with open(args.compare) as file:
+            previous = json.load(file)
+
+    print_results(results, previous)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Fastest journeys - Connection Scan over all flights sorted by departure
+instead of enumerating all paths.
+
+Forward scan (earliest_arrival) - flights are scanned from the earliest
+departure, a flight is used when it departs from the origin or within
+the layover window after a used flight arrived to its airport. Arrivals
+of used flights wait in a heap of every airport, the ones which can not
+be followed anymore are removed from its top. The scan stops once
+flights depart after the earliest arrival to the destination found.
+
+Reverse scan (arrival_profile) - flights are scanned from the latest
+departure, the earliest arrival to the destination with every flight
+is the earliest one of the flights in the layover window after it
+arrives (segment tree over flights of every airport). Every first
+flight from the origin then has its earliest arrival - the journeys
+which no journey departing later arrives before are the fastest ones
+for their departure.
+
+Like reachability.py, scans do not know airports visited on the way, so
+a journey found may visit an airport twice - such journeys are not valid
+and Graph searches those departures with an exact search instead, see
+Graph.fastest_path(). Flights arriving before they depart are not
+followed. Bounds of the search (see search_bounds.py) are not known
+to the scans either, searches with bounds use the exact search.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import heappop, heappush
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from helper_functions import MAX_LAYOVER, MIN_LAYOVER
+from process_airports import DepartureIndex, FlightTable
+from round_trips import CheapestInRange
+
+# arrival of a flight which can not reach the destination
+NEVER = float("inf")
+
+
+class ConnectionScan:
+    def __init__(self,
+                 flights: FlightTable,
+                 departure_index: DepartureIndex,
+                 order: Tuple[List[int], array],
+                 reaches: Sequence[int],
+                 min_layover: int = MIN_LAYOVER,
+                 max_layover: int = MAX_LAYOVER) -> None:
+        """
+        :param order: flights sorted by departure and their positions
+                      in the departure index, see departure_order()
+        :param reaches: flights which can reach the destination,
+                        see Reachability - the others are skipped
+        :param min_layover: layovers between flights (in seconds) are
+                            longer than this one and shorter than
+                            <max_layover>
+        """
+        self.min_layover = min_layover
+        self.max_layover = max_layover
+        self.flights = flights
+        self.departure_index = departure_index
+        self.flights_by_departure, self.positions = order
+        self.reaches = reaches
+
+    def earliest_arrival(self,
+                         origin: int,
+                         destination: int,
+                         bags: int = 0,
+                         departure: Optional[int] = None,
+                         soonest_arrival: Optional[int] = None
+                         ) -> Optional[Tuple[int, ...]]:
+        """
+        Path (flight indices) from <origin> to <destination> which
+        arrives the earliest (after <soonest_arrival>), its first flight
+        departs after <departure>. None when there is no such path.
+        """
+        flights = self.flights
+        reaches = self.reaches
+        min_layover = self.min_layover
+        max_layover = self.max_layover
+
+        # (arrival, flight index) of used flights to every airport,
+        # the earliest arrival on top
+        arrivals: Dict[int, List[Tuple[int, int]]] = dict()
+
+        # used flight -> flight before it, None for first flights
+        previous: Dict[int, Optional[int]] = dict()
+        earliest: Optional[int] = None
+
+        for flight_index in self.flights_by_departure:
+            flight_departure = flights.departure[flight_index]
+
+            if earliest is not None \
+                    and flight_departure >= flights.arrival[earliest]:
+                # no following flight arrives sooner
+                break
+
+            flight_origin = flights.origin[flight_index]
+            flight_destination = flights.destination[flight_index]
+
+            if not reaches[flight_index] \
+                    or flights.bags_allowed[flight_index] < bags \
+                    or flight_destination == origin:
+                continue
+
+            if flight_origin == origin:
+                if departure is not None and flight_departure <= departure:
+                    continue
+                previous[flight_index] = None
+            else:
+                waiting = arrivals.get(flight_origin)
+                if not waiting:
+                    continue
+
+                # arrivals after which the layover would be too long
+                # now, are too long for all following flights as well
+                while waiting and \
+                        waiting[0][0] + max_layover <= flight_departure:
+                    heappop(waiting)
+
+                if not waiting \
+                        or waiting[0][0] + min_layover >= flight_departure:
+                    continue
+                previous[flight_index] = waiting[0][1]
+
+            flight_arrival = flights.arrival[flight_index]
+
+            if flight_destination == destination:
+                if (soonest_arrival is None
+                        or flight_arrival > soonest_arrival) \
+                        and (earliest is None
+                             or flight_arrival < flights.arrival[earliest]):
+                    earliest = flight_index
+                continue
+
+            heappush(arrivals.setdefault(flight_destination, []),
+                     (flight_arrival, flight_index))
+
+        if earliest is None:
+            return None
+
+        path = [earliest]
+        while previous[path[-1]] is not None:
+            path.append(previous[path[-1]])
+
+        return tuple(reversed(path))
+
+    def arrival_profile(self,
+                        origin: int,
+                        destination: int,
+                        first_flights: Sequence[int],
+                        bags: int = 0,
+                        soonest_arrival: Optional[int] = None
+                        ) -> List[Optional[Tuple[int, ...]]]:
+        """
+        For every flight of <first_flights> (from <origin>) the path
+        which arrives to <destination> the earliest (after
+        <soonest_arrival>) starting with it, None when there is none.
+        """
+        flights = self.flights
+        reaches = self.reaches
+        departure_times = self.departure_index.departure_times
+        departure_flights = self.departure_index.departure_flights
+
+        # earliest arrival with every flight from the airport (ordered
+        # as in the departure index) and the earliest in any range
+        arrivals = [[NEVER] * len(airport_flights)
+                    for airport_flights in departure_flights]
+        earliest_in_range = [CheapestInRange(airport_arrivals)
+                             for airport_arrivals in arrivals]
+
+        # flight -> the following flight of its earliest arriving path
+        following: Dict[int, int] = dict()
+
+        for flight_index in reversed(self.flights_by_departure):
+            flight_origin = flights.origin[flight_index]
+            flight_destination = flights.destination[flight_index]
+
+            if not reaches[flight_index] \
+                    or flights.bags_allowed[flight_index] < bags \
+                    or flight_destination == origin \
+                    or flight_origin == destination:
+                continue
+
+            flight_arrival = flights.arrival[flight_index]
+
+            if flight_destination == destination:
+                if soonest_arrival is not None \
+                        and flight_arrival <= soonest_arrival:
+                    continue
+                arrival = flight_arrival
+            else:
+                times = departure_times[flight_destination]
+                first = bisect_right(times, flight_arrival + self.min_layover)
+                last = bisect_left(times,
+                                   flight_arrival + self.max_layover,
+                                   first)
+                if first == last:
+                    continue
+
+                position = earliest_in_range[flight_destination].position(
+                    first, last)
+                arrival = arrivals[flight_destination][position]
+                if arrival == NEVER:
+                    continue
+
+                following[flight_index] = \
+                    departure_flights[flight_destination][position]
+
+            position = self.positions[flight_index]
+            arrivals[flight_origin][position] = arrival
+            earliest_in_range[flight_origin].update(position)
+
+        paths: List[Optional[Tuple[int, ...]]] = []
+
+        for flight_index in first_flights:
+            if arrivals[origin][self.positions[flight_index]] == NEVER:
+                paths.append(None)
+                continue
+
+            path = [flight_index]
+            while path[-1] in following:
+                path.append(following[path[-1]])
+            paths.append(tuple(path))
+
+        return paths
@@ -0,0 +1,210 @@
+"""
+Delta updates of a loaded dataset - new flights, cancellations and
+changes of flights, without parsing the whole dataset again.
+
+Delta file is a .csv file with an "action" column and columns of the
+dataset (in any order), a flight is identified by its flight_no and
+departure:
+    action,flight_no,origin,destination,departure,arrival,base_price,...
+    append,ZH214,WIW,RFZ,2021-09-01T23:20:00,2021-09-02T03:50:00,168.0,...
+    delete,ZH214,,,2021-09-01T23:20:00,,,,
+    update,ZH214,,,2021-09-01T23:20:00,,199.0,,
+
+append needs all the columns, delete only the flight_no and departure,
+update changes only the columns which are not empty. Changes are applied
+in the order of the lines, see apply_updates().
+
+how to apply it to a snapshot of the dataset (see flights_index.py):
+python3 -m "flight_updates" "example/example3.csv" "delta.csv"
+"""
+import argparse
+import json
+import os.path
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, TextIO, Union
+
+from flights_index import Snapshot, default_snapshot_filename, file_hash, \
+    load_snapshot, write_snapshot
+from helper_functions import *
+from visit_airports import Graph
+
+APPEND = "append"
+DELETE = "delete"
+UPDATE = "update"
+ACTIONS = (APPEND, DELETE, UPDATE)
+
+
+class InvalidDelta(ValueError):
+    """Delta file or one of its changes is not valid"""
+
+
+class FlightUpdate(NamedTuple):
+    action: str
+    # parsed columns of the flight, None when the column is empty
+    flight: Dict[str, Optional[Union[str, int, float]]]
+
+
+def parse_value(category: str,
+                value: str) -> Optional[Union[str, int, float]]:
+    """Value of one column of a delta file, None when it is empty"""
+    value = value.strip()
+    if not value:
+        return None
+
+    try:
+        if category in ("departure", "arrival"):
+            return datetime_to_epoch(datetime.strptime(value, TIME_FORMAT))
+        if category in ("base_price", "bag_price"):
+            return float(value)
+        if category == "bags_allowed":
+            return int(value)
+    except ValueError:
+        raise InvalidDelta(f"Invalid {category}: {value}")
+
+    if category in ("origin", "destination") \
+            and not valid_airport_code(value):
+        raise InvalidDelta(f"Invalid airport code: {value}")
+
+    return value
+
+
+def read_delta(file: TextIO) -> List[FlightUpdate]:
+    header = [category.strip() for category in file.readline().split(",")]
+
+    unknown = set(header) - set(FLIGHT_INFORMATION) - {"action"}
+    if unknown:
+        raise InvalidDelta(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    if not {"action", "flight_no", "departure"} <= set(header):
+        raise InvalidDelta(
+            "Delta file needs action, flight_no and departure columns")
+
+    updates = []
+
+    for line_number, line in enumerate(file, start=2):
+        if not line.strip():
+            continue
+
+        values = line.rstrip("\r\n").split(",")
+        if len(values) != len(header):
+            raise InvalidDelta(f"Invalid line {line_number}")
+
+        columns = dict(zip(header, values))
+        action = columns.pop("action").strip()
+
+        if action not in ACTIONS:
+            raise InvalidDelta(
+                f"Invalid action on line {line_number}: {action}")
+
+        flight = {category: parse_value(category, columns.get(category, ""))
+                  for category in FLIGHT_INFORMATION}
+
+        if flight["flight_no"] is None or flight["departure"] is None:
+            raise InvalidDelta(
+                f"Flight number or departure is missing on line "
+                f"{line_number}")
+
+        if action == APPEND and None in flight.values():
+            raise InvalidDelta(
+                f"Appended flight on line {line_number} is not complete")
+
+        updates.append(FlightUpdate(action, flight))
+
+    return updates
+
+
+def load_delta(delta_filename: str) -> List[FlightUpdate]:
+    with open(delta_filename) as file:
+        return read_delta(file)
+
+
+def apply_updates(graph: Graph, updates: List[FlightUpdate]) -> Dict:
+    """
+    Applies <updates> to the graph one by one, returns numbers
+    of appended, deleted and updated flights. When an update is not
+    valid, the updates before it stay applied.
+    """
+    counts = {APPEND: 0, DELETE: 0, UPDATE: 0}
+
+    for action, flight in updates:
+        flight_index = graph.flights.find_flight(flight["flight_no"],
+                                                 flight["departure"])
+        flight_key = f"{flight['flight_no']} departing at " \
+            f"{epoch_to_str(flight['departure'])}"
+
+        if action == APPEND:
+            if flight_index is not None:
+                raise InvalidDelta(f"Flight {flight_key} already exists")
+            graph.append_flight(flight)
+        elif flight_index is None:
+            raise InvalidDelta(f"Flight {flight_key} does not exist")
+        elif action == DELETE:
+            graph.delete_flight(flight_index)
+        else:
+            graph.update_flight(flight_index, flight)
+
+        counts[action] += 1
+
+    return counts
+
+
+def update_snapshot(csv_filename: str,
+                    delta_filename: str,
+                    snapshot_filename: Optional[str] = None) -> Dict:
+    """
+    Applies the delta file to the snapshot of the dataset and stores it,
+    returns numbers of appended, deleted and updated flights.
+    """
+    if snapshot_filename is None:
+        snapshot_filename = default_snapshot_filename(csv_filename)
+
+    updates = load_delta(delta_filename)
+    snapshot = load_snapshot(csv_filename, snapshot_filename)
+
+    delta_hash = file_hash(delta_filename)
+    if delta_hash in snapshot.deltas:
+        raise InvalidDelta("Delta file was already applied")
+
+    graph = Graph(snapshot=snapshot)
+    counts = apply_updates(graph, updates)
+
+    write_snapshot(Snapshot(graph.flights,
+                            graph.flight_categories,
+                            graph.departure_index,
+                            snapshot.deltas + [delta_hash]),
+                   csv_filename,
+                   snapshot_filename)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Applies a delta file to the snapshot of a dataset")
+    parser.add_argument("dataset",
+                        type=str,
+                        help="Path to a .csv dataset of available flights")
+    parser.add_argument("delta",
+                        type=str,
+                        help="Path to a .csv file of changes")
+    parser.add_argument("--index",
+                        type=str,
+                        default=None,
+                        help="Path to the snapshot (default=<dataset>.idx)")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.dataset):
+        end_searching("Given dataset path could not be found")
+
+    if not os.path.isfile(args.delta):
+        end_searching("Given delta path could not be found")
+
+    try:
+        counts = update_snapshot(args.dataset, args.delta, args.index)
+    except InvalidDelta as error:
+        end_searching(str(error))
+
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+Snapshot of a parsed dataset - flight table and departure index stored
+in one binary file, which is opened with mmap instead of parsing
+the .csv file again.
+
+File layout:
+    MAGIC, length of the header (8 bytes), header as json,
+    columns and index as raw arrays (every one aligned to 8 bytes)
+
+The header describes the source .csv file (path, size, mtime, sha256),
+so a snapshot of a changed dataset is recognized and built again, and
+hashes of delta files applied to the snapshot (see flight_updates.py).
+
+how to build it:
+python3 -m "flights_index" "example/example3.csv"
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from helper_functions import *
+from load_flights import load_flights
+from process_airports import DepartureIndex, FlightTable
+from search_stats import SearchStats, phase
+
+MAGIC = b"FLIGHTS\0"
+SNAPSHOT_VERSION = 2
+
+# columns of the flight table and their array typecodes,
+# in the order they are stored in the file
+COLUMNS = [
+    ("flight_no", "i"), ("origin", "i"), ("destination", "i"),
+    ("departure", "q"), ("arrival", "q"), ("base_price", "d"),
+    ("bag_price", "d"), ("bags_allowed", "i"),
+    # tombstones of deleted flights, empty when none was deleted
+    ("deleted", "B")
+]
+
+# departure index - flights of all airports one after another,
+# airport_offsets[id] is where flights of the airport start
+INDEX_COLUMNS = [
+    ("airport_offsets", "q"), ("departure_times", "q"),
+    ("departure_flights", "i")
+]
+
+ALIGNMENT = 8
+
+
+class Snapshot:
+    """Parsed dataset - what Graph needs to be created"""
+    def __init__(self,
+                 flights: FlightTable,
+                 flight_categories: List[str],
+                 departure_index: DepartureIndex,
+                 deltas: Optional[List[str]] = None) -> None:
+        self.flights = flights
+        self.flight_categories = flight_categories
+        self.departure_index = departure_index
+
+        # hashes of delta files applied to the dataset
+        self.deltas: List[str] = deltas or []
+
+
+def default_snapshot_filename(csv_filename: str) -> str:
+    return csv_filename + ".idx"
+
+
+def file_hash(filename: str) -> str:
+    sha256 = hashlib.sha256()
+
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def source_key(csv_filename: str) -> Dict:
+    """What the snapshot was built from - without the hash"""
+    status = os.stat(csv_filename)
+    return {
+        "path": os.path.abspath(csv_filename),
+        "size": status.st_size,
+        "mtime_ns": status.st_mtime_ns
+    }
+
+
+def build_snapshot(csv_filename: str,
+                   stats: Optional[SearchStats] = None,
+                   processes: Optional[int] = None) -> Snapshot:
+    """
+    Parses the .csv dataset (in <processes> processes, see load_flights)
+    and indexes all its flights.
+    """
+    flights = FlightTable()
+    flight_categories = load_flights(csv_filename,
+                                     flights,
+                                     stats=stats,
+                                     processes=processes)
+
+    with phase(stats, "index"):
+        departure_index = DepartureIndex.build(flights)
+
+    return Snapshot(flights, flight_categories, departure_index)
+
+
+def write_snapshot(snapshot: Snapshot,
+                   csv_filename: str,
+                   snapshot_filename: str) -> None:
+    flights = snapshot.flights
+    departure_index = snapshot.departure_index
+
+    # flights of all airports one after another
+    airport_offsets = array("q", [0])
+    departure_times = array("q")
+    departure_flights = array("i")
+
+    for times, flight_indices in zip(departure_index.departure_times,
+                                     departure_index.departure_flights):
+        departure_times.extend(times)
+        departure_flights.extend(flight_indices)
+        airport_offsets.append(len(departure_flights))
+
+    arrays = [getattr(flights, name) for name, _ in COLUMNS[:-1]]
+    arrays.append(flights.deleted or bytearray())
+    arrays += [airport_offsets, departure_times, departure_flights]
+
+    header = source_key(csv_filename)
+    header.update({
+        "version": SNAPSHOT_VERSION,
+        "byteorder": sys.byteorder,
+        "sha256": file_hash(csv_filename),
+        "flight_categories": snapshot.flight_categories,
+        "airports": flights.airports,
+        "flight_numbers": flights.flight_numbers,
+        "deltas": snapshot.deltas,
+        "lengths": [len(values) for values in arrays]
+    })
+    header_bytes = json.dumps(header).encode()
+
+    # the snapshot is written to a temporary file first, so nobody
+    # can open a half written snapshot
+    temporary_filename = f"{snapshot_filename}.{os.getpid()}.tmp"
+
+    with open(temporary_filename, "wb") as file:
+        file.write(MAGIC)
+        file.write(len(header_bytes).to_bytes(8, "little"))
+        file.write(header_bytes)
+
+        for values in arrays:
+            file.write(bytes(-file.tell() % ALIGNMENT))
+            file.write(values)
+
+    os.replace(temporary_filename, snapshot_filename)
+
+
+def read_header(data: mmap.mmap) -> Tuple[Optional[Dict], int]:
+    """Header of the snapshot and where the arrays start"""
+    if data[:len(MAGIC)] != MAGIC:
+        return None, 0
+
+    start = len(MAGIC) + 8
+    header_length = int.from_bytes(data[len(MAGIC):start], "little")
+
+    try:
+        header = json.loads(data[start:start + header_length])
+    except ValueError:
+        return None, 0
+
+    return header, start + header_length
+
+
+def is_fresh(header: Dict, csv_filename: str) -> bool:
+    """
+    Was the snapshot built from the current version of the dataset?
+    The hash of the dataset is computed only when its size or
+    modification time changed - see update_header().
+    """
+    if header.get("version") != SNAPSHOT_VERSION \
+            or header.get("byteorder") != sys.byteorder:
+        return False
+
+    key = source_key(csv_filename)
+
+    if header["path"] != key["path"]:
+        return False
+
+    if header["size"] == key["size"] \
+            and header["mtime_ns"] == key["mtime_ns"]:
+        return True
+
+    return header["size"] == key["size"] \
+        and header["sha256"] == file_hash(csv_filename)
+
+
+def open_snapshot(csv_filename: str,
+                  snapshot_filename: str) -> Optional[Snapshot]:
+    """
+    Maps the snapshot into memory, columns are read directly from
+    the mapped file. Returns None when the snapshot does not exist
+    or it is stale.
+    """
+    try:
+        with open(snapshot_filename, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # file does not exist or it is empty
+        return None
+
+    try:
+        snapshot = read_snapshot(data, csv_filename, snapshot_filename)
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        # corrupt snapshot - it is built again
+        snapshot = None
+
+    if snapshot is None:
+        # views of the mapped file were released with read_snapshot
+        data.close()
+
+    return snapshot
+
+
+def update_header(snapshot_filename: str,
+                  header: Dict,
+                  header_length: int,
+                  csv_filename: str) -> None:
+    """
+    The dataset was touched but not changed (the hash is the same),
+    its new modification time is written to the header of the snapshot,
+    so the dataset is not hashed every time the snapshot is opened.
+    """
+    header = dict(header, mtime_ns=source_key(csv_filename)["mtime_ns"])
+    header_bytes = json.dumps(header).encode()
+
+    # arrays stay where they are - the header is padded with spaces,
+    # when it does not fit (never for times of 19 digits), it is kept
+    if len(header_bytes) > header_length:
+        return
+
+    try:
+        with open(snapshot_filename, "r+b") as file:
+            file.seek(len(MAGIC) + 8)
+            file.write(header_bytes.ljust(header_length))
+    except OSError:
+        # can not write the snapshot - the dataset is hashed next time
+        pass
+
+
+def read_snapshot(data: mmap.mmap,
+                  csv_filename: str,
+                  snapshot_filename: str) -> Optional[Snapshot]:
+    """
+    Snapshot with columns read from the mapped file <data>, None
+    when it is stale or truncated.
+    """
+    header, offset = read_header(data)
+    if header is None or not is_fresh(header, csv_filename):
+        return None
+
+    if header["mtime_ns"] != source_key(csv_filename)["mtime_ns"]:
+        update_header(snapshot_filename,
+                      header,
+                      offset - len(MAGIC) - 8,
+                      csv_filename)
+
+    view = memoryview(data)
+    columns = []
+
+    for (name, typecode), length in \
+            zip(COLUMNS + INDEX_COLUMNS, header["lengths"]):
+        offset += -offset % ALIGNMENT
+        size = length * array(typecode).itemsize
+
+        if offset + size > len(data):
+            # truncated snapshot
+            return None
+
+        columns.append(view[offset:offset + size].cast(typecode))
+        offset += size
+
+    flights = FlightTable()
+    for (name, _), column in zip(COLUMNS, columns):
+        setattr(flights, name, column)
+
+    if not flights.deleted:
+        flights.deleted = None
+
+    flights.airports = header["airports"]
+    flights.airport_ids = {airport: airport_id for airport_id, airport
+                           in enumerate(flights.airports)}
+    flights.flight_numbers = header["flight_numbers"]
+    flights.flight_number_ids = {
+        flight_number: flight_number_id for flight_number_id, flight_number
+        in enumerate(flights.flight_numbers)}
+
+    # the mapped file has to stay open as long as the columns are used
+    flights.buffer = data
+
+    airport_offsets, departure_times, departure_flights = columns[-3:]
+    departure_index = DepartureIndex()
+
+    for airport in range(len(airport_offsets) - 1):
+        first, last = airport_offsets[airport], airport_offsets[airport + 1]
+        departure_index.departure_times.append(departure_times[first:last])
+        departure_index.departure_flights.append(
+            departure_flights[first:last])
+
+    return Snapshot(flights,
+                    header["flight_categories"],
+                    departure_index,
+                    header["deltas"])
+
+
+def load_snapshot(csv_filename: str,
+                  snapshot_filename: Optional[str] = None,
+                  stats: Optional[SearchStats] = None,
+                  processes: Optional[int] = None) -> Snapshot:
+    """
+    Opens snapshot of the dataset, when it does not exist or it is
+    stale, parses the dataset and stores a new snapshot.
+    """
+    if snapshot_filename is None:
+        snapshot_filename = default_snapshot_filename(csv_filename)
+
+    with phase(stats, "snapshot"):
+        snapshot = open_snapshot(csv_filename, snapshot_filename)
+
+    if snapshot is None:
+        snapshot = build_snapshot(csv_filename, stats, processes)
+        try:
+            with phase(stats, "snapshot"):
+                write_snapshot(snapshot, csv_filename, snapshot_filename)
+        except OSError:
+            # can not write the snapshot - search without it
+            pass
+
+    return snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Builds snapshot of a dataset for fast searching")
+    parser.add_argument("dataset",
+                        type=str,
+                        help="Path to a .csv dataset of available flights")
+    parser.add_argument("--output",
+                        type=str,
+                        default=None,
+                        help="Path to the snapshot "
+                             "(default=<dataset>.idx)")
+    parser.add_argument("--processes",
+                        type=int,
+                        default=None,
+                        help="Number of processes parsing the dataset "
+                             "(default=1)")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.dataset):
+        end_searching("Given dataset path could not be found")
+
+    if args.processes is not None and args.processes < 1:
+        end_searching("Number of processes has to be positive")
+
+    snapshot_filename = args.output
+    if snapshot_filename is None:
+        snapshot_filename = default_snapshot_filename(args.dataset)
+
+    write_snapshot(build_snapshot(args.dataset, processes=args.processes),
+                   args.dataset,
+                   snapshot_filename)
+    print(snapshot_filename)
+
+
+if __name__ == "__main__":
+    main()
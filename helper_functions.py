@@ -1,5 +1,9 @@
+import os.path
 import sys
+from calendar import timegm
 from datetime import datetime
+from time import gmtime, strftime
+from typing import Dict, List, Optional
 
 USAGE = f"Usage: python {sys.argv[0]} [--help] | dataset origin " \
     "destination --bags --return --returnarrival --arival --departure"
@@ -10,6 +14,52 @@ FLIGHT_INFORMATION = [
     "arrival", "base_price", "bag_price", "bags_allowed"
 ]
 
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+# layover between two flights has to be more than 1 hour
+# and less than 6 hours (in seconds)
+MIN_LAYOVER = 3600
+MAX_LAYOVER = 6 * 3600
+
+# airports of searches from one to many or many to many airports are
+# separated by commas, this one means all airports of the dataset
+AIRPORTS_SEPARATOR = ","
+ALL_AIRPORTS = "*"
+
+# parameters of a search given as a json object (search server,
+# batch of searches) and their default values
+SEARCH_PARAMETERS = {
+    "origin": None,
+    "destination": None,
+    "bags": 0,
+    "return": False,
+    "arrival": None,
+    "departure": None,
+    "returnarrival": None,
+    "limit": None,
+    "round_trip": False,
+    "fastest": False,
+    "per_departure": False,
+    "pareto": False,
+    "max_legs": None,
+    "max_travel_time": None,
+    "max_price": None,
+    "min_layover": None,
+    "max_layover": None
+}
+
+# parameters of a search given as text (airport codes and times)
+TEXT_PARAMETERS = ["origin", "destination", "arrival", "departure",
+                   "returnarrival"]
+
+# bounds of a search, see search_bounds.py
+SEARCH_BOUNDS = ["max_legs", "max_travel_time", "max_price",
+                 "min_layover", "max_layover"]
+
+
+class InvalidRequirements(ValueError):
+    """Customer's requirements of a search are not valid"""
+
 
 def valid_airport_code(code: str) -> bool:
     if len(code) == 3:
@@ -19,6 +69,13 @@ def valid_airport_code(code: str) -> bool:
     return False
 
 
+def airport_list(airports: str) -> Optional[List[str]]:
+    """Airport codes separated by commas, None for all airports"""
+    if airports == ALL_AIRPORTS:
+        return None
+    return airports.split(AIRPORTS_SEPARATOR)
+
+
 def end_searching(reason: str):
     print(f"Error: {reason}")
     raise SystemExit(USAGE)
@@ -27,9 +84,228 @@ def end_searching(reason: str):
 
 def str_to_datetime(time: str) -> datetime:
     try:
-        return datetime.strptime(time, "%Y-%m-%dT%H:%M:%S")
+        return datetime.strptime(time, TIME_FORMAT)
     except ValueError:
         # can not format into datetime object
         end_searching(
             "Invalid time - was suppossed to be as YYYY-MM-DDTHH:MM:SS")
 
+
+def datetime_to_epoch(time: datetime) -> int:
+    """Seconds since 1970-01-01, all times in the dataset are UTC"""
+    return timegm(time.timetuple())
+
+
+def str_to_epoch(time: str) -> int:
+    return datetime_to_epoch(str_to_datetime(time))
+
+
+def epoch_to_str(seconds: int) -> str:
+    return strftime(TIME_FORMAT, gmtime(seconds))
+
+
+def check_requirements(requirements: Dict) -> Dict:
+    """
+    Checks the customer's requirements of a search (the same as
+    arguments of solution.py) and returns them with times converted
+    to datetime objects. Raises InvalidRequirements with the reason
+    when they are not valid.
+    """
+    requirements = dict(requirements)
+
+    # one to many airports or many to many airports (see airport_list)
+    to_many = requirements.get("to_many") or requirements.get("matrix")
+    origins = [requirements["origin"]]
+    destinations = [requirements["destination"]]
+
+    if requirements.get("matrix"):
+        origins = airport_list(requirements["origin"]) or []
+    if to_many:
+        destinations = airport_list(requirements["destination"]) or []
+
+    # checks for valid input
+    if not all(valid_airport_code(origin) for origin in origins):
+        raise InvalidRequirements("Invalid origin airport code, e.g. KSC")
+
+    if not all(valid_airport_code(destination)
+               for destination in destinations):
+        raise InvalidRequirements(
+            "Invalid destination airport code, e.g. CDG")
+
+    if "dataset" in requirements \
+            and not os.path.isfile(requirements["dataset"]):
+        raise InvalidRequirements("Given dataset path could not be found")
+
+    if requirements["origin"] == requirements["destination"] \
+            and not to_many:
+        raise InvalidRequirements(
+            "Origin and destination airports can not be the same")
+
+    if to_many and (requirements["return"]
+                    or requirements.get("round_trip")
+                    or requirements.get("limit")
+                    or requirements.get("fastest")
+                    or requirements.get("pareto")):
+        raise InvalidRequirements(
+            "Searches to many airports can not be used with return "
+            "flights, round trips, limit, fastest or pareto")
+
+    if requirements.get("to_many") and requirements.get("matrix"):
+        raise InvalidRequirements(
+            "Search to many airports and matrix can not be used together")
+
+    if requirements["returnarrival"] and not requirements["return"] \
+            and not requirements.get("round_trip"):
+        raise InvalidRequirements(
+            "Return arrival was specified but it is not a return flight")
+
+    if requirements["bags"] < 0:
+        raise InvalidRequirements("Number of bags can not be negative")
+
+    if requirements.get("fastest") and (requirements.get("round_trip")
+                                        or requirements.get("limit")):
+        raise InvalidRequirements(
+            "Fastest journeys can not be searched with round trips "
+            "or limit")
+
+    if requirements.get("pareto") and (requirements.get("round_trip")
+                                       or requirements.get("limit")
+                                       or requirements.get("fastest")):
+        raise InvalidRequirements(
+            "Pareto optimal journeys can not be searched with round trips, "
+            "limit or fastest")
+
+    if requirements.get("per_departure") and not requirements.get("fastest"):
+        raise InvalidRequirements(
+            "Journeys per departure can be searched only with fastest")
+
+    check_bounds(requirements)
+
+    # checks for valid input + converts
+    for time in ("arrival", "departure", "returnarrival"):
+        if requirements[time] is not None:
+            try:
+                requirements[time] = \
+                    datetime.strptime(requirements[time], TIME_FORMAT)
+            except ValueError:
+                # can not format into datetime object
+                raise InvalidRequirements(
+                    "Invalid time - was suppossed to be as "
+                    "YYYY-MM-DDTHH:MM:SS")
+
+    # valid input check - does customer want to arrive to the
+    # destination sooner than he leaves?
+    if requirements["arrival"] is not None \
+            and requirements["departure"] is not None:
+
+        # we have already converted arrival and departure from str
+        # to datetime objects if both were not none, now we can compare
+        # them as datetime objects
+        if requirements["arrival"] < requirements["departure"]:
+            raise InvalidRequirements("Arrival is sooner than departure")
+
+    # valid input check - does he want to arrive home sooner than he leaves?
+    if requirements["returnarrival"] is not None \
+            and requirements["departure"] is not None:
+        if requirements["returnarrival"] < requirements["departure"]:
+            raise InvalidRequirements(
+                "Return arrival is sooner than departure")
+
+    return requirements
+
+
+def check_bounds(requirements: Dict) -> None:
+    """Checks bounds of the search (travel time and layovers in minutes)"""
+    if requirements.get("max_legs") is not None \
+            and requirements["max_legs"] < 1:
+        raise InvalidRequirements(
+            "Maximum number of flights has to be a positive number")
+
+    for bound, name in (("max_travel_time", "Maximum travel time"),
+                        ("max_price", "Maximum price"),
+                        ("min_layover", "Minimum layover")):
+        if requirements.get(bound) is not None and requirements[bound] < 0:
+            raise InvalidRequirements(f"{name} can not be negative")
+
+    min_layover = requirements.get("min_layover")
+    max_layover = requirements.get("max_layover")
+
+    if min_layover is None:
+        min_layover = MIN_LAYOVER // 60
+    if max_layover is None:
+        max_layover = MAX_LAYOVER // 60
+
+    if max_layover <= min_layover:
+        raise InvalidRequirements(
+            "Maximum layover has to be longer than minimum layover")
+
+
+def parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def parse_optional_int(value) -> Optional[int]:
+    if value is None:
+        return None
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidRequirements(f"Invalid number: {value}")
+
+
+def parse_optional_float(value) -> Optional[float]:
+    if value is None:
+        return None
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise InvalidRequirements(f"Invalid number: {value}")
+
+
+def search_requirements(parameters: Dict) -> Dict:
+    """
+    Converts parameters of a search given as a json object into
+    the customer's requirements, checks if they are valid - see
+    check_requirements.
+    """
+    unknown = set(parameters) - set(SEARCH_PARAMETERS)
+    if unknown:
+        raise InvalidRequirements(
+            f"Unknown parameters: {', '.join(sorted(unknown))}")
+
+    requirements = dict(SEARCH_PARAMETERS)
+    requirements.update(parameters)
+
+    if requirements["origin"] is None \
+            or requirements["destination"] is None:
+        raise InvalidRequirements(
+            "Origin and destination have to be specified")
+
+    # json values of other types (numbers, lists, ...) are not
+    # converted, they are not valid airport codes or times
+    for name in TEXT_PARAMETERS:
+        if requirements[name] is not None \
+                and not isinstance(requirements[name], str):
+            raise InvalidRequirements(f"Invalid {name}: {requirements[name]}")
+
+    requirements["bags"] = parse_optional_int(requirements["bags"]) or 0
+    requirements["return"] = parse_bool(requirements["return"])
+    requirements["round_trip"] = parse_bool(requirements["round_trip"])
+    requirements["fastest"] = parse_bool(requirements["fastest"])
+    requirements["per_departure"] = parse_bool(requirements["per_departure"])
+    requirements["pareto"] = parse_bool(requirements["pareto"])
+    requirements["limit"] = parse_optional_int(requirements["limit"])
+    requirements["max_price"] = parse_optional_float(requirements["max_price"])
+
+    for bound in ("max_legs", "max_travel_time", "min_layover",
+                  "max_layover"):
+        requirements[bound] = parse_optional_int(requirements[bound])
+
+    if requirements["limit"] is not None and requirements["limit"] < 1:
+        raise InvalidRequirements("Limit has to be a positive number")
+
+    return check_requirements(requirements)
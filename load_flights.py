@@ -0,0 +1,373 @@
+import mmap
+import multiprocessing
+import os
+from array import array
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, \
+    Tuple, Union
+
+from helper_functions import *
+from process_airports import FlightTable
+from search_stats import SearchStats, phase, timed
+
+# how many bytes of the .csv file are parsed at once
+CHUNK_SIZE = 1 << 20
+
+# releases read pages of the memory mapped file, not on every platform
+MADV_DONTNEED = getattr(mmap, "MADV_DONTNEED", None)
+
+# columns of interned values - see FlightTable
+INTERNED_COLUMNS = ("flight_no", "origin", "destination")
+
+# chunk of the dataset parsed by a worker process - path to the dataset,
+# offsets of the first and after the last byte of the chunk, categories
+RangeTask = Tuple[str, int, int, List[str]]
+
+# columns of a chunk parsed by a worker process and distinct values
+# of its interned columns, the columns keep indices into them
+ParsedRange = Tuple[Dict[str, Sequence], Dict[str, List[str]]]
+
+
+class InvalidChunk(Exception):
+    """A chunk of the dataset could not be parsed column-wise"""
+
+
+def less_categories(flight_categories: List[str]) -> bool:
+    """
+    Determines if the given .csv file has the all the columns as
+    is specified in the assignment - checks if our .csv is valid
+    """
+    return len(set(flight_categories)) < len(set(FLIGHT_INFORMATION))
+
+
+def read_categories(header: str) -> List[str]:
+    """
+    Parses the header row of the dataset - categories / csv columns
+    in their original order.
+    """
+    flight_categories = header.strip().split(",")
+
+    # checks if the dataset is valid - according to the assignment
+    # it is okay if:
+    #   - the columns do not have the same order in
+    #       different datasets
+    #   - there are more columns than the ones we need
+    if less_categories(flight_categories):
+        end_searching("Some columns is the dataset are missing.")
+
+    return flight_categories
+
+
+def load_flights(csv_filename: str,
+                 flights: FlightTable,
+                 chunk_size: int = CHUNK_SIZE,
+                 stats: Optional[SearchStats] = None,
+                 processes: Optional[int] = None) -> List[str]:
+    """
+    Maps the .csv dataset to memory and appends its flights to <flights>
+    in chunks of whole lines. Every chunk is parsed column by column
+    from bytes, only distinct airport codes and flight numbers are
+    decoded - the file is never read into memory as a whole.
+    With more than one of <processes>, chunks are parsed by worker
+    processes - see load_in_parallel().
+
+    Returns categories of the dataset in their original order.
+    """
+    with open(csv_filename, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # an empty file can not be mapped
+            return read_categories("")
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_end = data.find(b"\n")
+            if header_end == -1:
+                header_end = len(data)
+
+            flight_categories = read_categories(data[:header_end].decode())
+
+            if processes is not None and processes > 1:
+                load_in_parallel(csv_filename,
+                                 data,
+                                 header_end + 1,
+                                 flight_categories,
+                                 flights,
+                                 chunk_size,
+                                 processes,
+                                 stats)
+                return flight_categories
+
+            for lines in read_chunks(data, header_end + 1, chunk_size, stats):
+                add_chunk(lines, flight_categories, flights, stats)
+
+    return flight_categories
+
+
+def chunk_ranges(data: mmap.mmap,
+                 start: int,
+                 chunk_size: int) -> Iterator[Tuple[int, int]]:
+    """
+    Offsets of the first and after the last byte of chunks of <data>
+    from <start>, about <chunk_size> bytes each - a chunk always ends
+    at the end of a line.
+    """
+    while start < len(data):
+        end = data.find(b"\n", start + chunk_size)
+        end = len(data) if end == -1 else end + 1
+        yield start, end
+        start = end
+
+
+def read_chunks(data: mmap.mmap,
+                start: int,
+                chunk_size: int,
+                stats: Optional[SearchStats] = None) -> Iterator[List[bytes]]:
+    """
+    Lines of <data> from <start> in chunks, see chunk_ranges(). Pages
+    of the file which were already read are released, so only about
+    one chunk of the file is kept in memory.
+    """
+    for chunk_start, chunk_end in chunk_ranges(data, start, chunk_size):
+        with phase(stats, "read"):
+            lines = data[chunk_start:chunk_end].splitlines()
+
+            if MADV_DONTNEED is not None:
+                data.madvise(MADV_DONTNEED,
+                             0,
+                             chunk_end - chunk_end % mmap.PAGESIZE)
+
+        yield lines
+
+
+def load_in_parallel(csv_filename: str,
+                     data: mmap.mmap,
+                     start: int,
+                     flight_categories: List[str],
+                     flights: FlightTable,
+                     chunk_size: int,
+                     processes: int,
+                     stats: Optional[SearchStats] = None) -> None:
+    """
+    Chunks of lines (see chunk_ranges) are parsed by <processes> worker
+    processes, the parsed columns are appended to <flights> in the order
+    of the chunks - flights keep their order from the .csv file and
+    the same ids as when they are loaded in one process.
+
+    A chunk a worker could not parse is parsed again in this process,
+    so the customer gets the same error.
+    """
+    ranges = list(chunk_ranges(data, start, chunk_size))
+    if not ranges:
+        return
+
+    tasks = [(csv_filename, chunk_start, chunk_end, flight_categories)
+             for chunk_start, chunk_end in ranges]
+
+    with multiprocessing.Pool(min(processes, len(tasks))) as pool:
+        parsed_ranges = timed(stats, pool.imap(parse_range, tasks), "parse")
+
+        for (chunk_start, chunk_end), parsed in zip(ranges, parsed_ranges):
+            if parsed is None:
+                add_chunk(data[chunk_start:chunk_end].splitlines(),
+                          flight_categories,
+                          flights,
+                          stats)
+                continue
+
+            columns, distinct_values = parsed
+            with phase(stats, "add"):
+                extend_table(flights, columns, distinct_values)
+
+
+def parse_range(task: RangeTask) -> Optional[ParsedRange]:
+    """
+    Parses a chunk of the dataset in a worker process, None when it
+    can not be parsed column-wise. Values of interned columns are
+    replaced by indices into their distinct values, so only a few
+    strings are sent back.
+    """
+    csv_filename, start, end, flight_categories = task
+
+    with open(csv_filename, "rb") as file:
+        file.seek(start)
+        lines = file.read(end - start).splitlines()
+
+    try:
+        columns = parse_columns(lines, flight_categories)
+
+        distinct_values = dict()
+        for category in INTERNED_COLUMNS:
+            distinct_values[category], columns[category] = \
+                distinct_indices(columns[category])
+    except (InvalidChunk, ValueError):
+        return None
+
+    return columns, distinct_values
+
+
+def add_chunk(lines: List[bytes],
+              flight_categories: List[str],
+              flights: FlightTable,
+              stats: Optional[SearchStats] = None) -> None:
+    """
+    Parses lines of the dataset column-wise and appends them
+    to <flights>.
+
+    When something in the chunk is invalid, the chunk is parsed again
+    line by line so that the customer gets the same error as when the
+    flights are read one by one.
+    """
+    with phase(stats, "parse"):
+        try:
+            columns = parse_columns(lines, flight_categories)
+        except (InvalidChunk, ValueError):
+            scratch = FlightTable()
+            for line in lines:
+                scratch.add_flight(line.decode(), flight_categories)
+
+            # every line is valid, the chunk only contains values parsed
+            # differently - e.g. time not zero padded
+            columns = columns_from_table(scratch)
+
+    with phase(stats, "add"):
+        extend_table(flights, columns)
+
+
+def parse_columns(lines: List[bytes],
+                  flight_categories: List[str]) -> Dict[str, Sequence]:
+    rows = [line.split(b",") for line in lines]
+
+    for row in rows:
+        if len(row) != len(FLIGHT_INFORMATION):
+            raise InvalidChunk()
+
+    # transposes rows into columns
+    columns: Dict[str, Sequence] = dict()
+
+    for category, column in zip(flight_categories, zip(*rows)):
+        if category in ("departure", "arrival"):
+            columns[category] = parse_times(column)
+        elif category in ("base_price", "bag_price"):
+            columns[category] = array("d", map(float, column))
+        elif category == "bags_allowed":
+            columns[category] = array("i", map(int, column))
+        elif category in ("origin", "destination"):
+            for code in set(column):
+                if not valid_airport_code(code.decode()):
+                    raise InvalidChunk()
+            columns[category] = column
+        else:
+            # remaining value leave as bytes - flight number,
+            # decoded when it is interned
+            columns[category] = column
+
+    return columns
+
+
+# caches of already parsed dates and times of day, the datasets contain
+# only a few distinct days and minutes
+_DAYS: Dict[bytes, int] = dict()
+_TIMES_OF_DAY: Dict[bytes, int] = dict()
+
+
+def parse_times(column: Sequence[bytes]) -> array:
+    """
+    Converts YYYY-MM-DDTHH:MM:SS values to seconds since epoch. Every
+    distinct value of the chunk is parsed once, date and time of day
+    separately and cached.
+    """
+    days = _DAYS
+    times_of_day = _TIMES_OF_DAY
+    seconds: Dict[bytes, int] = dict()
+
+    for value in set(column):
+        if len(value) != 19 or value[10:11] != b"T":
+            # not the usual format, let the line by line parser decide
+            raise InvalidChunk()
+
+        date = value[:10]
+        day = days.get(date)
+        if day is None:
+            day = datetime_to_epoch(
+                datetime.strptime(date.decode(), "%Y-%m-%d"))
+            days[date] = day
+
+        time_of_day = value[11:]
+        time_seconds = times_of_day.get(time_of_day)
+        if time_seconds is None:
+            parsed = datetime.strptime(time_of_day.decode(), "%H:%M:%S")
+            time_seconds = \
+                parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+            times_of_day[time_of_day] = time_seconds
+
+        seconds[value] = day + time_seconds
+
+    return array("q", map(seconds.__getitem__, column))
+
+
+def columns_from_table(table: FlightTable) -> Dict[str, Sequence]:
+    return {
+        "flight_no": [table.get_flight_no(i) for i in range(len(table))],
+        "origin": [table.get_origin(i) for i in range(len(table))],
+        "destination":
+            [table.get_destination(i) for i in range(len(table))],
+        "departure": table.departure,
+        "arrival": table.arrival,
+        "base_price": table.base_price,
+        "bag_price": table.bag_price,
+        "bags_allowed": table.bags_allowed
+    }
+
+
+def extend_table(
+        flights: FlightTable,
+        columns: Dict[str, Sequence],
+        distinct_values: Optional[Dict[str, List[str]]] = None
+) -> None:
+    """
+    Appends parsed columns to the flight table. With <distinct_values>,
+    interned columns hold indices into them (see parse_range) instead
+    of the values.
+    """
+    for category in INTERNED_COLUMNS:
+        intern = flights.flight_number_id if category == "flight_no" \
+            else flights.airport_id
+
+        if distinct_values is None:
+            ids = interned(columns[category], intern)
+        else:
+            # the values were already numbered in the order they first
+            # appear, they are interned in the same order
+            table_ids = [intern(value)
+                         for value in distinct_values[category]]
+            ids = map(table_ids.__getitem__, columns[category])
+
+        getattr(flights, category).extend(ids)
+
+    flights.departure.extend(columns["departure"])
+    flights.arrival.extend(columns["arrival"])
+    flights.base_price.extend(columns["base_price"])
+    flights.bag_price.extend(columns["bag_price"])
+    flights.bags_allowed.extend(columns["bags_allowed"])
+
+
+def interned(values: Sequence[Union[str, bytes]],
+             intern: Callable[[str], int]) -> Iterator[int]:
+    """
+    Ids of <values> - every distinct value is decoded and interned once,
+    in the order the values first appear.
+    """
+    ids = {value: intern(value.decode() if isinstance(value, bytes)
+                         else value)
+           for value in dict.fromkeys(values)}
+    return map(ids.__getitem__, values)
+
+
+def distinct_indices(values: Sequence[bytes]) -> Tuple[List[str], array]:
+    """
+    Distinct <values> decoded, in the order they first appear, and index
+    of every value among them.
+    """
+    indices = {value: index
+               for index, value in enumerate(dict.fromkeys(values))}
+    return [value.decode() for value in indices], \
+        array("i", map(indices.__getitem__, values))
@@ -0,0 +1,220 @@
+"""
+Pareto optimal journeys - combinations which no other combination beats
+in total price, travel time and number of flights at the same time
+(it is not worse in any of them and better in at least one).
+
+Round based search (like RAPTOR) - round k extends partial journeys of
+k - 1 flights by one flight. Every flight has a bag of partial journeys
+which end with it, a partial journey is dropped when a journey in the
+bag of the same flight dominates it:
+  - it is not more expensive, does not have more flights and its first
+    flight does not depart sooner (travel time of every continuation
+    is not longer), it is better in at least one of them
+  - it has visited only airports the other one has visited as well,
+    so it can continue with any flight the other one can
+Flights (not airports) have the bags - which flights can follow depends
+on the exact arrival. Partial journeys are dropped as well when a found
+journey to the destination beats all their continuations, or when they
+are over bounds of the search (see search_bounds.py).
+
+Prices are expected not to be negative and flights not to arrive before
+they depart.
+"""
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, \
+    Tuple
+
+from helper_functions import MIN_LAYOVER
+from process_airports import FlightTable
+from search_bounds import SearchBounds
+
+# (price, travel time, number of flights) and path of a journey
+# to the destination
+FoundPath = Tuple[Tuple[float, int, int], Tuple[int, ...]]
+
+
+class Label:
+    """Partial journey ending with the last flight of <path>"""
+    __slots__ = ("price", "departure", "path", "visited", "dropped")
+
+    def __init__(self,
+                 price: float,
+                 departure: int,
+                 path: Tuple[int, ...],
+                 visited: FrozenSet[int]) -> None:
+        self.price = price
+        # departure of the first flight
+        self.departure = departure
+        self.path = path
+        self.visited = visited
+        # a dominating journey was added to the bag later
+        self.dropped = False
+
+    def dominates(self, other: "Label") -> bool:
+        if self.price > other.price \
+                or len(self.path) > len(other.path) \
+                or self.departure < other.departure:
+            return False
+
+        if self.price == other.price \
+                and len(self.path) == len(other.path) \
+                and self.departure == other.departure:
+            # the same - both are kept
+            return False
+
+        return self.visited <= other.visited
+
+
+def add_to_bag(bag: List[Label], label: Label) -> bool:
+    """
+    Adds <label> to the bag if no label in it dominates it and drops
+    labels it dominates. Returns whether it was added.
+    """
+    for other in bag:
+        if other.dominates(label):
+            return False
+
+    kept = []
+    for other in bag:
+        if label.dominates(other):
+            other.dropped = True
+        else:
+            kept.append(other)
+
+    bag[:] = kept
+    bag.append(label)
+    return True
+
+
+def pareto_filter(paths: Sequence[FoundPath]) -> List[FoundPath]:
+    """
+    Paths with their (price, travel time, number of flights) which
+    no other path beats in all of them - sorted by them.
+    """
+    optimal = []
+
+    for criteria, path in sorted(paths, key=lambda item: item[0]):
+        # a dominating path is sorted before, unless it is the same
+        if not any(all(better <= worse for better, worse
+                       in zip(other_criteria, criteria))
+                   and other_criteria != criteria
+                   for other_criteria, _ in optimal):
+            optimal.append((criteria, path))
+
+    return optimal
+
+
+def pareto_paths(flights: FlightTable,
+                 next_flights: Callable[[int, int], Sequence[int]],
+                 add_flight_price: Callable[[float, int], float],
+                 reaches: Sequence[int],
+                 origin: int,
+                 destination: int,
+                 first_flights: Sequence[int],
+                 bags: int = 0,
+                 soonest_arrival: Optional[int] = None,
+                 bounds: Optional[SearchBounds] = None,
+                 min_layover: int = MIN_LAYOVER
+                 ) -> List[Tuple[int, ...]]:
+    """
+    Pareto optimal paths from <origin> to <destination> (ids of the
+    airports) starting with one of <first_flights> and arriving after
+    <soonest_arrival>, sorted by price, travel time and number of
+    flights.
+
+    :param next_flights: flights which can follow a flight arriving
+                         to an airport at a time, see Graph
+    :param add_flight_price: adds price of a flight with the customer's
+                             bags to a price, see Graph
+    :param reaches: flights which can reach the destination,
+                    see Reachability - the others are skipped
+    :param min_layover: the shortest layover <next_flights> allow
+    """
+    # journeys to the destination found so far
+    found: List[FoundPath] = []
+
+    def arrive(label: Label) -> None:
+        arrival = flights.arrival[label.path[-1]]
+        if soonest_arrival is None or arrival > soonest_arrival:
+            found.append(((label.price,
+                           arrival - label.departure,
+                           len(label.path)),
+                          label.path))
+
+    def is_beaten(label: Label) -> bool:
+        """Does a found journey beat every continuation of <label>?"""
+        # the next flight departs after the shortest layover
+        shortest_travel_time = flights.arrival[label.path[-1]] \
+            + min_layover - label.departure
+
+        return any(price <= label.price
+                   and legs <= len(label.path) + 1
+                   and travel_time <= shortest_travel_time
+                   for (price, travel_time, legs), _ in found)
+
+    bags_of_flights: Dict[int, List[Label]] = dict()
+    labels: List[Label] = []
+
+    for flight_index in first_flights:
+        flight_destination = flights.destination[flight_index]
+
+        if flight_destination == origin \
+                or flights.bags_allowed[flight_index] < bags \
+                or not reaches[flight_index]:
+            continue
+
+        label = Label(add_flight_price(0.0, flight_index),
+                      flights.departure[flight_index],
+                      (flight_index,),
+                      frozenset((origin, flight_destination)))
+
+        if bounds is not None \
+                and not bounds.allows(label.path,
+                                      label.price,
+                                      flight_destination == destination):
+            continue
+
+        if flight_destination == destination:
+            arrive(label)
+        elif add_to_bag(bags_of_flights.setdefault(flight_index, []), label):
+            labels.append(label)
+
+    # every round adds one flight to the journeys of the previous one
+    while labels:
+        next_labels: List[Label] = []
+
+        for label in labels:
+            if label.dropped or is_beaten(label):
+                continue
+
+            last_flight = label.path[-1]
+
+            for flight_index in next_flights(flights.destination[last_flight],
+                                             flights.arrival[last_flight]):
+                flight_destination = flights.destination[flight_index]
+
+                if flight_destination in label.visited \
+                        or flights.bags_allowed[flight_index] < bags \
+                        or not reaches[flight_index]:
+                    continue
+
+                extended = Label(add_flight_price(label.price, flight_index),
+                                 label.departure,
+                                 label.path + (flight_index,),
+                                 label.visited | {flight_destination})
+
+                if bounds is not None \
+                        and not bounds.allows(extended.path,
+                                              extended.price,
+                                              flight_destination
+                                              == destination):
+                    continue
+
+                if flight_destination == destination:
+                    arrive(extended)
+                elif add_to_bag(bags_of_flights.setdefault(flight_index, []),
+                                extended):
+                    next_labels.append(extended)
+
+        labels = next_labels
+
+    return [path for _, path in pareto_filter(found)]
@@ -1,43 +1,370 @@
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import OrderedDict
-from datetime import datetime, timedelta
-from typing import Dict, List, Union
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, \
+    Optional, Sequence, Tuple, Union
 
 from helper_functions import *
 
 
-class Flight:
-    """Stores information about a flight"""
-    def __init__(self,
-                 flight_line: str,
-                 flight_categories: List[str]) -> None:
-        """Accepts one line of a csv file and parses it"""
-        self.flight_data: Dict[str, Union[str, int, float, datetime]]
-        self.flight_data = dict()
-
-        split_flight_line = flight_line.split(",")
+class FlightTable:
+    """
+    Stores information about all flights column by column.
+
+    One flight is one index into the columns, the index is the order
+    of the flight in the .csv file. Airport codes and flight numbers
+    are interned - columns only keep their ids, times are stored
+    as seconds since epoch.
+    """
+    def __init__(self) -> None:
+        # interned strings, the id is an index into the list
+        self.airports: List[str] = []
+        self.airport_ids: Dict[str, int] = dict()
+        self.flight_numbers: List[str] = []
+        self.flight_number_ids: Dict[str, int] = dict()
+
+        # columns
+        self.flight_no = array("i")
+        self.origin = array("i")
+        self.destination = array("i")
+        self.departure = array("q")
+        self.arrival = array("q")
+        self.base_price = array("d")
+        self.bag_price = array("d")
+        self.bags_allowed = array("i")
+
+        # memory mapped file the columns are read from, if any
+        self.buffer = None
+
+        # tombstones of deleted flights - deleted[flight index] = 1,
+        # None when no flight was deleted
+        self.deleted: Optional[bytearray] = None
+
+        # (flight number id, departure) -> index of the first flight
+        # which is not deleted, created when a flight is looked up
+        # for the first time - indices of the other flights with
+        # the same key (usually none) are kept in duplicate keys
+        self.__flight_keys: Optional[Dict[Tuple[int, int], int]] = None
+        self.__duplicate_keys: Dict[Tuple[int, int], List[int]] = dict()
+
+    def __len__(self) -> int:
+        return len(self.departure)
+
+    def airport_id(self, airport_code: str) -> int:
+        """Returns id of the airport, registers the airport if it is new"""
+        airport_id = self.airport_ids.get(airport_code)
+
+        if airport_id is None:
+            airport_id = len(self.airports)
+            self.airports.append(airport_code)
+            self.airport_ids[airport_code] = airport_id
+
+        return airport_id
+
+    def flight_number_id(self, flight_number: str) -> int:
+        flight_number_id = self.flight_number_ids.get(flight_number)
+
+        if flight_number_id is None:
+            flight_number_id = len(self.flight_numbers)
+            self.flight_numbers.append(flight_number)
+            self.flight_number_ids[flight_number] = flight_number_id
+
+        return flight_number_id
+
+    def add_flight(self,
+                   flight_line: str,
+                   flight_categories: List[str]) -> int:
+        """
+        Accepts one line of a csv file, parses it and appends it
+        to the columns. Returns index of the new flight.
+        """
+        split_flight_line = flight_line.rstrip("\r\n").split(",")
 
         if len(split_flight_line) != len(FLIGHT_INFORMATION):
             # when the lines of data in the dataset
             # dont match the length of the header line
             end_searching(".csv dataset contains invalid lines")
 
-        for index, value in enumerate(flight_line.split(",")):
+        flight_data: Dict[str, Union[str, int, float]] = dict()
+
+        for index, value in enumerate(split_flight_line):
             category = flight_categories[index]
 
             if category in ("departure", "arrival"):
-                self.flight_data[category] = str_to_datetime(value)
+                flight_data[category] = str_to_epoch(value)
             elif category in ("base_price", "bag_price"):
-                self.flight_data[category] = float(value)
+                flight_data[category] = float(value)
             elif category == "bags_allowed":
-                self.flight_data[category] = int(value)
+                flight_data[category] = int(value)
             elif category in ("origin", "destination"):
                 if valid_airport_code(value):
-                    self.flight_data[category] = value
+                    flight_data[category] = value
                 else:
                     end_searching("csv file contains invalid airport codes")
             else:
                 # remaining value leave as string - flight number
-                self.flight_data[category] = value
+                flight_data[category] = value
+
+        self.flight_no.append(self.flight_number_id(flight_data["flight_no"]))
+        self.origin.append(self.airport_id(flight_data["origin"]))
+        self.destination.append(self.airport_id(flight_data["destination"]))
+        self.departure.append(flight_data["departure"])
+        self.arrival.append(flight_data["arrival"])
+        self.base_price.append(flight_data["base_price"])
+        self.bag_price.append(flight_data["bag_price"])
+        self.bags_allowed.append(flight_data["bags_allowed"])
+
+        return len(self.departure) - 1
+
+    def make_writable(self) -> None:
+        """Copies columns read from a memory mapped file into arrays"""
+        for name in ("flight_no", "origin", "destination", "departure",
+                     "arrival", "base_price", "bag_price", "bags_allowed"):
+            column = getattr(self, name)
+
+            if not isinstance(column, array):
+                # memory views of the snapshot are cast to their type,
+                # frombytes() takes only views of bytes
+                writable = array(column.format)
+                writable.frombytes(column.cast("B"))
+                setattr(self, name, writable)
+
+        if self.deleted is not None and not isinstance(self.deleted,
+                                                       bytearray):
+            self.deleted = bytearray(self.deleted)
+
+    def is_deleted(self, flight_index: int) -> bool:
+        return self.deleted is not None and self.deleted[flight_index] == 1
+
+    def find_flight(self, flight_number: str, departure: int) -> Optional[int]:
+        """
+        Index of the flight with <flight_number> departing at <departure>
+        which is not deleted - the first one of them if there are more.
+        """
+        if self.__flight_keys is None:
+            self.__flight_keys = dict()
+            self.__duplicate_keys = dict()
+
+            for flight_index in range(len(self)):
+                if not self.is_deleted(flight_index):
+                    self.__add_key(flight_index)
+
+        flight_number_id = self.flight_number_ids.get(flight_number)
+        return self.__flight_keys.get((flight_number_id, departure))
+
+    def append_flight(self, flight: Dict[str, Union[str, int, float]]) -> int:
+        """
+        Appends an already parsed flight to the columns (see
+        make_writable), returns index of the new flight.
+        """
+        flight_index = len(self)
+
+        self.flight_no.append(self.flight_number_id(flight["flight_no"]))
+        self.origin.append(self.airport_id(flight["origin"]))
+        self.destination.append(self.airport_id(flight["destination"]))
+        self.departure.append(flight["departure"])
+        self.arrival.append(flight["arrival"])
+        self.base_price.append(flight["base_price"])
+        self.bag_price.append(flight["bag_price"])
+        self.bags_allowed.append(flight["bags_allowed"])
+
+        if self.deleted is not None:
+            self.deleted.append(0)
+
+        if self.__flight_keys is not None:
+            self.__add_key(flight_index)
+
+        return flight_index
+
+    def __key(self, flight_index: int) -> Tuple[int, int]:
+        return self.flight_no[flight_index], self.departure[flight_index]
+
+    def __add_key(self, flight_index: int) -> None:
+        """Flights are added in the order of their indices"""
+        key = self.__key(flight_index)
+
+        if key in self.__flight_keys:
+            self.__duplicate_keys.setdefault(key, []).append(flight_index)
+        else:
+            self.__flight_keys[key] = flight_index
+
+    def __remove_key(self, flight_index: int) -> None:
+        key = self.__key(flight_index)
+        duplicates = self.__duplicate_keys.get(key)
+
+        if self.__flight_keys.get(key) == flight_index:
+            if duplicates:
+                # the next flight with the same key is found instead
+                self.__flight_keys[key] = duplicates.pop(0)
+            else:
+                del self.__flight_keys[key]
+        elif duplicates and flight_index in duplicates:
+            duplicates.remove(flight_index)
+
+        if key in self.__duplicate_keys and not duplicates:
+            del self.__duplicate_keys[key]
+
+    def delete_flight(self, flight_index: int) -> None:
+        """
+        Marks the flight as deleted, it stays in the columns so indices
+        of other flights do not change.
+        """
+        if self.deleted is None:
+            self.deleted = bytearray(len(self))
+
+        if self.deleted[flight_index] == 1:
+            return
+
+        self.deleted[flight_index] = 1
+
+        if self.__flight_keys is not None:
+            self.__remove_key(flight_index)
+
+    def get_flight(self,
+                   flight_index: int) -> Dict[str, Union[str, int, float]]:
+        """The flight read from the columns - as append_flight accepts it"""
+        return {
+            "flight_no": self.get_flight_no(flight_index),
+            "origin": self.get_origin(flight_index),
+            "destination": self.get_destination(flight_index),
+            "departure": self.departure[flight_index],
+            "arrival": self.arrival[flight_index],
+            "base_price": self.base_price[flight_index],
+            "bag_price": self.bag_price[flight_index],
+            "bags_allowed": self.bags_allowed[flight_index]
+        }
+
+    def get_flight_no(self, flight_index: int) -> str:
+        return self.flight_numbers[self.flight_no[flight_index]]
+
+    def get_origin(self, flight_index: int) -> str:
+        return self.airports[self.origin[flight_index]]
+
+    def get_destination(self, flight_index: int) -> str:
+        return self.airports[self.destination[flight_index]]
+
+
+class DepartureIndex:
+    """
+    For every airport (its id in the flight table) departures sorted
+    by time and indices of the departing flights in the same order:
+    departure_times[airport id]   = [1630458300, 1630462800, ...]
+    departure_flights[airport id] = [4, 0, ...]
+
+    Flights that can follow a flight arriving at the airport
+    are found with binary search in departure_times.
+    """
+    def __init__(self) -> None:
+        self.departure_times: List[Sequence[int]] = []
+        self.departure_flights: List[Sequence[int]] = []
+
+    def add_airport(self, airport: int) -> None:
+        """
+        Adds vertices to the graph of airports up to <airport>.
+        """
+        while len(self.departure_times) <= airport:
+            self.departure_times.append(array("q"))
+            self.departure_flights.append(array("i"))
+
+    def add_flight(self, flights: FlightTable, flight_index: int) -> None:
+        """
+        Adds an edge to the graph between the origin
+        and destination airport - flights have to be added
+        sorted by their departure.
+        """
+        origin_airport = flights.origin[flight_index]
+        destination_airport = flights.destination[flight_index]
+
+        self.add_airport(max(origin_airport, destination_airport))
+
+        self.departure_times[origin_airport].append(
+            flights.departure[flight_index])
+        self.departure_flights[origin_airport].append(flight_index)
+
+    def insert_flight(self, flights: FlightTable, flight_index: int) -> int:
+        """
+        Adds a new flight to the index in place - after the flights
+        departing at the same time. Returns position of the flight
+        among the flights departing from its airport.
+        """
+        origin_airport = flights.origin[flight_index]
+        destination_airport = flights.destination[flight_index]
+        departure = flights.departure[flight_index]
+
+        self.add_airport(max(origin_airport, destination_airport))
+        self.__make_writable(origin_airport)
+
+        departure_times = self.departure_times[origin_airport]
+        position = bisect_right(departure_times, departure)
+
+        departure_times.insert(position, departure)
+        self.departure_flights[origin_airport].insert(position, flight_index)
+        return position
+
+    def position(self, flights: FlightTable, flight_index: int) -> int:
+        """Position of the flight among the flights from its airport"""
+        origin_airport = flights.origin[flight_index]
+        departure_times = self.departure_times[origin_airport]
+        departure_flights = self.departure_flights[origin_airport]
+
+        departure = flights.departure[flight_index]
+        position = bisect_left(departure_times, departure)
+
+        while departure_flights[position] != flight_index:
+            position += 1
+
+        return position
+
+    def __make_writable(self, airport: int) -> None:
+        # flights of the airport may be read from a memory mapped file
+        if not isinstance(self.departure_times[airport], array):
+            self.departure_times[airport] = \
+                array("q", self.departure_times[airport])
+            self.departure_flights[airport] = \
+                array("i", self.departure_flights[airport])
+
+    @classmethod
+    def build(cls,
+              flights: FlightTable,
+              accept: Optional[Callable[[int], bool]] = None
+              ) -> "DepartureIndex":
+        """
+        Creates index of all flights, or only of those for which
+        <accept> returns True.
+        """
+        index = cls()
+
+        # every airport of the dataset is a vertex, even when
+        # none of its flights is accepted
+        index.add_airport(len(flights.airports) - 1)
+
+        # flights are added to the index in chronological order
+        flights_by_time = sorted(range(len(flights)),
+                                 key=flights.departure.__getitem__)
+
+        if accept is not None:
+            flights_by_time = filter(accept, flights_by_time)
+
+        for flight_index in flights_by_time:
+            index.add_flight(flights, flight_index)
+
+        return index
+
+
+class Combination(NamedTuple):
+    """
+    One flight combination as it is stored while searching - it is
+    formatted into the output only when it is written.
+    """
+    # indices of flights sorted chronologically - how one travels
+    flights: Tuple[int, ...]
+    total_price: float
+    # the least number of bags allowed by the flights
+    bags_allowed: int
+    # seconds from the first departure to the last arrival
+    travel_time: int
+    is_return: bool
 
 
 class FlightCombinations:
@@ -45,12 +372,10 @@ class FlightCombinations:
                  destination: str,
                  origin: str,
                  bags: int,
-                 flights: List[Flight],
+                 flights: FlightTable,
                  flight_categories: List[str]) -> None:
 
-        self.combinations: \
-            List[OrderedDict[str, Union[List[OrderedDict], str, int, float]]]
-        self.combinations = []
+        self.combinations: List[Combination] = []
 
         self.bags = bags
         self.destination = destination
@@ -58,109 +383,179 @@ class FlightCombinations:
         self.flights = flights
         self.flight_categories = flight_categories
 
-    def add_path(self, path: List[int], is_return: bool) -> None:
+        # formatted flights - one flight is usually a part
+        # of many combinations, it is formatted only once
+        self.__formatted_flights: Dict[int, OrderedDict] = dict()
+
+    def add_path(self, path: Sequence[int], is_return: bool) -> None:
         """
-        Adds formatted path (flights combination) to the result.
+        Adds path (flights combination) to the result.
 
         :param path: list of flight indices sorted
                      chronologically - how one travels
         """
-        self.combinations.append(self.__format_path(path, is_return))
-
-    def __convert_timedelta(self, time: timedelta) -> str:
-        total_sec = int(time.total_seconds())
+        self.combinations.append(self.combination(path, is_return))
+
+    def sorted_records(self) -> List[Combination]:
+        """All flight combinations found so far sorted by price"""
+        return sorted(self.combinations, key=attrgetter("total_price"))
+
+    def sorted_combinations(self) -> List[OrderedDict]:
+        """All flight combinations found so far sorted by price, formatted"""
+        return list(self.format_combinations(self.sorted_records()))
+
+    def combinations_of(self,
+                        paths: Iterable[Sequence[int]],
+                        is_return: bool) -> Iterator[Combination]:
+        """Combinations of <paths> one by one"""
+        for path in paths:
+            yield self.combination(path, is_return)
+
+    def format_combinations(self, combinations: Iterable[Combination]
+                            ) -> Iterator[OrderedDict]:
+        """Formats <combinations> one by one"""
+        for combination in combinations:
+            yield self.format_combination(combination)
+
+    def __convert_seconds(self, total_sec: int) -> str:
         hrs = total_sec // 3600
         min = (total_sec // 60) % 60
         sec = total_sec - hrs * 3600 - min * 60
         return f"{hrs}:{min:02d}:{sec:02d}"
 
-    def __total_travel_time(self, flights_indices: List[int]) -> str:
-        # <flights> are ordered by time chronologically
-
-        # gets flight on the same index as the first flight of our trip
-        first_flight = self.flights[flights_indices[0]]
-
-        # gets flight on the same index as the last flight of our trip
-        last_flight = self.flights[flights_indices[-1]]
-
-        first_departure = first_flight.flight_data["departure"]
-        last_arrival = last_flight.flight_data["arrival"]
-
-        total_time = last_arrival - first_departure
-        return self.__convert_timedelta(total_time)
-
-    def __format_path(self,
-                        flights_indices: List[int],
-                        is_return: bool) -> OrderedDict:
-        """
-        Merges <flights> into one dict with the same structure
-        as the sample output.
-        """
+    def combination(self,
+                    flights_indices: Sequence[int],
+                    is_return: bool) -> Combination:
+        """Price, bags and travel time of the journey"""
         total_price = 0.0
         allowed_bags = 100
 
+        flights = self.flights
+
         # get information about the journey
         for flight_index in flights_indices:
-            flight = self.flights[flight_index]
-
             # gets total flight price
-            total_price += flight.flight_data["base_price"]
+            total_price += flights.base_price[flight_index]
 
             # we know that the number of bags <= bags_allowed
-            total_price += flight.flight_data["bag_price"] * self.bags
+            total_price += flights.bag_price[flight_index] * self.bags
 
             # gets number of allowed bags
-            current_bags = flight.flight_data["bags_allowed"]
+            current_bags = flights.bags_allowed[flight_index]
             allowed_bags = min(allowed_bags, current_bags)
 
-        # get flight time
-        total_time = self.__total_travel_time(flights_indices)
+        # flights are ordered chronologically - from departure of the
+        # first flight of our trip to arrival of the last one
+        travel_time = flights.arrival[flights_indices[-1]] \
+            - flights.departure[flights_indices[0]]
 
+        return Combination(tuple(flights_indices),
+                           total_price,
+                           allowed_bags,
+                           travel_time,
+                           is_return)
+
+    def format_summary(self,
+                       cheapest_price: Optional[float],
+                       shortest_travel_time: Optional[int]) -> OrderedDict:
+        """
+        Cheapest price and shortest travel time of all combinations
+        from origin to destination, None when there is no combination.
+        """
+        summary = OrderedDict()
+        summary["origin"] = self.origin
+        summary["destination"] = self.destination
+        summary["cheapest_price"] = cheapest_price
+        summary["shortest_travel_time"] = None \
+            if shortest_travel_time is None \
+            else self.__convert_seconds(shortest_travel_time)
+        return summary
+
+    def format_combination(self, combination: Combination) -> OrderedDict:
+        """
+        Merges flights of <combination> into one dict with the same
+        structure as the sample output.
+        """
         # put acquired information into the correct format,
         # preserving their order
         new_flight = OrderedDict()
 
-        new_flight["flights"] = []
-
-        for flight_index in flights_indices:
-            flight = self.flights[flight_index].flight_data
-
-            # flights are stored as list of ordered_dict
-            new_flight["flights"].append(self.__get_ordered_dict(flight))
+        # flights are stored as list of ordered_dict
+        new_flight["flights"] = [self.__get_ordered_dict(flight_index)
+                                 for flight_index in combination.flights]
 
-        new_flight["bags_allowed"] = allowed_bags
+        new_flight["bags_allowed"] = combination.bags_allowed
         new_flight["bags_count"] = self.bags
 
         # if the flight is return, swap origin and destination airports
-        if is_return:
+        if combination.is_return:
             new_flight["destination"] = self.origin
             new_flight["origin"] = self.destination
         else:
             new_flight["destination"] = self.destination
             new_flight["origin"] = self.origin
 
-        new_flight["total_price"] = total_price
-        new_flight["travel_time"] = total_time
+        new_flight["total_price"] = combination.total_price
+        new_flight["travel_time"] = \
+            self.__convert_seconds(combination.travel_time)
 
         return new_flight
 
-    def __datetime_to_str(self, time: datetime) -> str:
-        return time.strftime("%Y-%m-%dT%H:%M:%S")
-
-    def __get_ordered_dict(self, flight_data: Dict) -> OrderedDict:
+    def format_round_trip(self,
+                          outbound: Combination,
+                          inbound: Combination) -> OrderedDict:
+        """
+        Outbound and inbound combination of a round trip together
+        with their total price and travel time.
+        """
+        round_trip = OrderedDict()
+
+        round_trip["outbound"] = self.format_combination(outbound)
+        round_trip["inbound"] = self.format_combination(inbound)
+        round_trip["bags_allowed"] = min(outbound.bags_allowed,
+                                         inbound.bags_allowed)
+        round_trip["bags_count"] = self.bags
+        round_trip["destination"] = self.destination
+        round_trip["origin"] = self.origin
+        round_trip["total_price"] = outbound.total_price + inbound.total_price
+
+        # time spent travelling - without the stay at the destination
+        round_trip["travel_time"] = \
+            self.__convert_seconds(outbound.travel_time + inbound.travel_time)
+
+        return round_trip
+
+    def format_round_trips(
+            self,
+            round_trips: Iterable[Tuple[Combination, Combination]]
+    ) -> Iterator[OrderedDict]:
+        """Formats <round_trips> one by one"""
+        for outbound, inbound in round_trips:
+            yield self.format_round_trip(outbound, inbound)
+
+    def __get_ordered_dict(self, flight_index: int) -> OrderedDict:
         """
-        Converts a dictionary to OrderedDict using the order of flight
-        categories as the sample output requires
+        Reads one flight from the columns into an OrderedDict using
+        the order of flight categories as the sample output requires,
+        the same OrderedDict is returned for the same flight
         """
+        flight = self.__formatted_flights.get(flight_index)
+        if flight is not None:
+            return flight
+
+        flights = self.flights
         flight = OrderedDict()
 
-        # categories in FLIGHT_INFORMATION are sorted in the same way
+        # categories in FLIGHT_INFORMATION are sorted in the same way
         # we want the output to be
-        for category in FLIGHT_INFORMATION:
-            if category in ("departure", "arrival"):
-                datetime_time = flight_data[category]
-                flight[category] = self.__datetime_to_str(datetime_time)
-            else:
-                flight[category] = flight_data[category]
-
+        flight["flight_no"] = flights.get_flight_no(flight_index)
+        flight["origin"] = flights.get_origin(flight_index)
+        flight["destination"] = flights.get_destination(flight_index)
+        flight["departure"] = epoch_to_str(flights.departure[flight_index])
+        flight["arrival"] = epoch_to_str(flights.arrival[flight_index])
+        flight["base_price"] = flights.base_price[flight_index]
+        flight["bag_price"] = flights.bag_price[flight_index]
+        flight["bags_allowed"] = flights.bags_allowed[flight_index]
+
+        self.__formatted_flights[flight_index] = flight
         return flight
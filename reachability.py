@@ -0,0 +1,189 @@
+"""
+Which flights can still reach a destination airport - the search does
+not continue with flights from which the destination can not be reached
+in time (respecting the layovers).
+
+Flights are scanned from the latest departure to the earliest one,
+flights that can follow a flight depart later than it arrives, so they
+are already known when the flight is scanned. For every airport,
+next_reachable[airport][position] is the position of the first flight
+(among the flights departing from the airport sorted by departure) at
+or after <position> which can reach the destination - a range of flights
+contains such a flight when next_reachable of its start is in the range.
+
+Airports visited on the way and the customer's bags are not taken into
+account, so the result is the same for every search to the destination.
+Searches to many destinations at once skip flights which can not reach
+any of them.
+Deleted flights can not reach anything.
+
+When flights are deleted or added (see flight_updates.py), reachability
+is updated where it is cheap - a flight that is not marked may lead to
+the destination, a marked one may not (anymore), so only the searches
+which skip fewer flights are affected.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import FrozenSet, List, Optional, Tuple, Union
+
+from helper_functions import MAX_LAYOVER, MIN_LAYOVER
+from process_airports import DepartureIndex, FlightTable
+
+
+class Reachability:
+    def __init__(self,
+                 flights: FlightTable,
+                 departure_index: DepartureIndex,
+                 destination: Union[int, FrozenSet[int]],
+                 order: Optional[Tuple[List[int], array]] = None,
+                 min_layover: int = MIN_LAYOVER,
+                 max_layover: int = MAX_LAYOVER) -> None:
+        """
+        :param destination: id of the destination airport or ids
+                            of airports one of which is to be reached
+        :param order: the same for every destination, see departure_order()
+        :param min_layover: layovers between flights (in seconds) are
+                            longer than this one and shorter than
+                            <max_layover>
+        """
+        self.min_layover = min_layover
+        self.max_layover = max_layover
+        self.destinations: FrozenSet[int] = \
+            frozenset((destination,)) if isinstance(destination, int) \
+            else destination
+        self.departure_index = departure_index
+
+        # reaches[flight index] = 1 if the destination can be reached
+        # with the flight (or the flight goes there), 0 otherwise
+        self.reaches = bytearray(len(flights))
+
+        self.next_reachable: List[array] = [
+            array("i", [len(flight_indices)]) * len(flight_indices)
+            for flight_indices in departure_index.departure_flights]
+
+        if order is None:
+            order = departure_order(flights, departure_index)
+
+        self.__scan(flights, *order)
+
+    def __scan(self,
+               flights: FlightTable,
+               flights_by_departure: List[int],
+               positions: array) -> None:
+        departure_times = self.departure_index.departure_times
+        next_reachable = self.next_reachable
+        reaches = self.reaches
+        min_layover = self.min_layover
+        max_layover = self.max_layover
+
+        for flight_index in reversed(flights_by_departure):
+            destination = flights.destination[flight_index]
+            arrival = flights.arrival[flight_index]
+
+            if flights.is_deleted(flight_index):
+                reachable = False
+            elif destination in self.destinations:
+                reachable = True
+            elif arrival + min_layover < flights.departure[flight_index]:
+                # invalid times - following flights may not be scanned
+                # yet, the flight is not skipped
+                reachable = True
+            else:
+                times = departure_times[destination]
+                first = bisect_right(times, arrival + min_layover)
+                last = bisect_left(times, arrival + max_layover, first)
+                reachable = first < last \
+                    and next_reachable[destination][first] < last
+
+            origin = flights.origin[flight_index]
+            position = positions[flight_index]
+            origin_next = next_reachable[origin]
+
+            if reachable:
+                reaches[flight_index] = 1
+                origin_next[position] = position
+            elif position + 1 < len(origin_next):
+                origin_next[position] = origin_next[position + 1]
+
+    def delete_flight(self, flights: FlightTable, flight_index: int) -> None:
+        """The flight was deleted - it can not be used anymore"""
+        if not self.reaches[flight_index]:
+            return
+
+        self.reaches[flight_index] = 0
+
+        origin_next = self.next_reachable[flights.origin[flight_index]]
+        deleted = self.departure_index.position(flights, flight_index)
+
+        following = origin_next[deleted + 1] \
+            if deleted + 1 < len(origin_next) else len(origin_next)
+
+        # the flight and flights before it which point to it
+        # point to the next reachable flight instead
+        position = deleted
+        while position >= 0 and origin_next[position] == deleted:
+            origin_next[position] = following
+            position -= 1
+
+    def insert_flight(self,
+                      flights: FlightTable,
+                      flight_index: int,
+                      position: int) -> bool:
+        """
+        The flight was added to the departure index at <position>, it is
+        added if it can not reach the destination. Returns False when
+        the flight can reach it - other flights may reach it through
+        the flight, reachability has to be created again.
+        """
+        destination = flights.destination[flight_index]
+        origin = flights.origin[flight_index]
+
+        if destination in self.destinations or destination == origin \
+                or flight_index != len(self.reaches) \
+                or origin >= len(self.next_reachable) \
+                or destination >= len(self.next_reachable) \
+                or self.can_reach(destination, flights.arrival[flight_index]):
+            return False
+
+        self.reaches.append(0)
+
+        # positions after the new flight are moved by one
+        origin_next = self.next_reachable[origin]
+        moved = array("i", [next_position + 1 if next_position >= position
+                            else next_position
+                            for next_position in origin_next])
+        moved.insert(position, moved[position] if position < len(moved)
+                     else len(origin_next) + 1)
+
+        self.next_reachable[origin] = moved
+        return True
+
+    def can_reach(self, airport: int, arrival_time: int) -> bool:
+        """
+        Can the destination be reached from <airport>
+        after arriving there at <arrival_time>?
+        """
+        if airport in self.destinations:
+            return True
+
+        times = self.departure_index.departure_times[airport]
+        first = bisect_right(times, arrival_time + self.min_layover)
+        last = bisect_left(times, arrival_time + self.max_layover, first)
+        return first < last and self.next_reachable[airport][first] < last
+
+
+def departure_order(flights: FlightTable,
+                    departure_index: DepartureIndex) -> Tuple[List[int], array]:
+    """
+    Indices of all flights sorted by departure and position of every
+    flight among the flights departing from its airport.
+    """
+    flights_by_departure = sorted(range(len(flights)),
+                                  key=flights.departure.__getitem__)
+
+    positions = array("i", bytes(4 * len(flights)))
+    for flight_indices in departure_index.departure_flights:
+        for position, flight_index in enumerate(flight_indices):
+            positions[flight_index] = position
+
+    return flights_by_departure, positions
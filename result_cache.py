@@ -0,0 +1,204 @@
+"""
+Cache of search results - searches with the same parameters against
+the same version of the dataset are answered from the cache.
+
+Results are kept as json, the least recently used results are removed
+when there are more than <max_entries> of them or when they take more
+than <max_bytes>, results older than <ttl> seconds are not used.
+The cache can be stored in a file and loaded again, so searches from
+separate runs of solution.py share it.
+
+Any update of the flights (a delta file or an append, delete or update,
+see flight_updates.py) changes the dataset version, so it invalidates
+the whole cache - not only results with the changed flight. A new
+flight may lead to new combinations of any search, and results of
+searches which keep only some combinations (limit, fastest, pareto)
+may change even when they do not contain the changed flight.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from visit_airports import Graph, Query
+
+# default limits of the cache
+CACHE_ENTRIES = 1000
+CACHE_BYTES = 64 << 20
+
+
+def cache_key(query: Query, dataset_version: str) -> str:
+    """Key of the search - parameters of <query> and the dataset version"""
+    return json.dumps([
+        dataset_version,
+        query.origin,
+        query.destination,
+        query.bags,
+        query.with_return,
+        query.round_trip,
+        query.fastest,
+        query.per_departure,
+        query.pareto,
+        query.departure,
+        query.arrival,
+        query.return_arrival,
+        query.limit,
+        query.max_legs,
+        query.max_travel_time,
+        query.max_price,
+        query.min_layover,
+        query.max_layover
+    ])
+
+
+def is_entry(entry) -> bool:
+    """Is <entry> of a cache file [key, time it was stored, result]?"""
+    return isinstance(entry, list) and len(entry) == 3 \
+        and isinstance(entry[0], str) \
+        and isinstance(entry[1], (int, float)) \
+        and not isinstance(entry[1], bool) \
+        and isinstance(entry[2], str)
+
+
+class ResultCache:
+    def __init__(self,
+                 max_entries: int = CACHE_ENTRIES,
+                 max_bytes: int = CACHE_BYTES,
+                 ttl: Optional[float] = None,
+                 filename: Optional[str] = None) -> None:
+        """
+        :param ttl: how many seconds results are valid, None = forever
+        :param filename: file the cache is loaded from and stored to
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.filename = filename
+
+        # key -> (time the result was stored, result as json),
+        # the least recently used one first
+        self.__entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.__bytes = 0
+        self.__changed = False
+
+        # searches of the server use the cache from more threads
+        self.__lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        if filename is not None:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: str) -> Optional[List[OrderedDict]]:
+        """Cached result of the search, None when it is not cached"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+
+            if entry is not None and self.__is_expired(entry[0]):
+                self.__remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.__entries.move_to_end(key)
+
+        return json.loads(entry[1], object_pairs_hook=OrderedDict)
+
+    def put(self, key: str, result: List[OrderedDict]) -> None:
+        self.__store(key, time.time(), json.dumps(result))
+
+    def search(self, graph: Graph, query: Query) -> List[OrderedDict]:
+        """Graph.search answered from the cache if possible"""
+        key = cache_key(query, graph.dataset_version())
+        result = self.get(key)
+
+        if result is None:
+            result = graph.search(query)
+            self.put(key, result)
+
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.__entries),
+                "bytes": self.__bytes
+            }
+
+    def load(self) -> None:
+        """Adds results stored in the file to the cache"""
+        try:
+            with open(self.filename) as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            # the file does not exist yet or it is broken
+            return
+
+        if not isinstance(entries, list):
+            # not a cache file
+            return
+
+        for entry in entries:
+            if not is_entry(entry):
+                # broken entries are skipped
+                continue
+
+            key, stored, result = entry
+            self.__store(key, stored, result)
+
+        self.__changed = False
+
+    def save(self) -> None:
+        """Stores the cache in the file, if it has changed"""
+        if self.filename is None or not self.__changed:
+            return
+
+        with self.__lock:
+            entries = [[key, stored, result] for key, (stored, result)
+                       in self.__entries.items()
+                       if not self.__is_expired(stored)]
+            self.__changed = False
+
+        # other processes never read a half written file
+        temporary_filename = f"{self.filename}.{os.getpid()}.tmp"
+
+        with open(temporary_filename, "w") as file:
+            json.dump(entries, file)
+
+        os.replace(temporary_filename, self.filename)
+
+    def __store(self, key: str, stored: float, result: str) -> None:
+        if self.__is_expired(stored) or len(result) > self.max_bytes:
+            return
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__remove(key)
+
+            self.__entries[key] = (stored, result)
+            self.__bytes += len(result)
+            self.__changed = True
+
+            # the least recently used results are removed
+            while len(self.__entries) > self.max_entries \
+                    or self.__bytes > self.max_bytes:
+                self.__remove(next(iter(self.__entries)))
+
+    def __remove(self, key: str) -> None:
+        _, result = self.__entries.pop(key)
+        self.__bytes -= len(result)
+        self.__changed = True
+
+    def __is_expired(self, stored: float) -> bool:
+        return self.ttl is not None and time.time() - stored > self.ttl
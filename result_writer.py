@@ -0,0 +1,135 @@
+"""
+Writes flight combinations as json one by one while they are found,
+the whole document is never built in memory.
+
+output formats:
+  pretty  - json list indented by 4 spaces, the same as
+            dumps(combinations, indent=4)
+  compact - json list on one line, the same as dumps(combinations)
+  ndjson  - one combination per line
+
+Combinations (see process_airports.Combination) which do not fit
+in memory are sorted by price with an external merge sort - sorted
+runs are stored in temporary files and merged while they are written,
+see sort_by_price(). They are formatted only when they are written.
+"""
+import pickle
+import sys
+import tempfile
+from collections import OrderedDict
+from heapq import merge
+from json import dumps
+from operator import attrgetter
+from typing import BinaryIO, Iterable, Iterator, List, Optional, TextIO
+
+from process_airports import Combination
+
+PRETTY = "pretty"
+COMPACT = "compact"
+NDJSON = "ndjson"
+
+# indentation of one level in the pretty output
+INDENT = " " * 4
+
+# how many combinations are sorted in memory before they are
+# stored in a temporary file
+SORT_BUFFER_SIZE = 100000
+
+
+def write_combinations(combinations: Iterable[OrderedDict],
+                       output: Optional[TextIO] = None,
+                       output_format: str = PRETTY) -> None:
+    """Writes <combinations> one by one to <output> (default=stdout)"""
+    if output is None:
+        output = sys.stdout
+
+    if output_format == NDJSON:
+        for combination in combinations:
+            output.write(dumps(combination))
+            output.write("\n")
+        return
+
+    if output_format == COMPACT:
+        opening, separator, closing = "[", ", ", "]\n"
+    else:
+        opening, separator, closing = "[\n" + INDENT, ",\n" + INDENT, "\n]\n"
+
+    written = False
+
+    for combination in combinations:
+        output.write(separator if written else opening)
+
+        if output_format == COMPACT:
+            output.write(dumps(combination))
+        else:
+            # every line of the combination is indented one level more
+            # as it is an item of the list
+            output.write(
+                dumps(combination, indent=4).replace("\n", "\n" + INDENT))
+
+        written = True
+
+    if written:
+        output.write(closing)
+    else:
+        # nothing was found
+        output.write("[]\n")
+
+
+def spill_run(combinations: List[Combination]) -> BinaryIO:
+    """Stores sorted <combinations> in a temporary file"""
+    run = tempfile.TemporaryFile()
+
+    for combination in combinations:
+        pickle.dump(tuple(combination), run, pickle.HIGHEST_PROTOCOL)
+
+    run.seek(0)
+    return run
+
+
+def read_run(run: BinaryIO) -> Iterator[Combination]:
+    """Combinations stored by spill_run, the file is closed at the end"""
+    with run:
+        while True:
+            try:
+                values = pickle.load(run)
+            except EOFError:
+                return
+
+            yield Combination(*values)
+
+
+def sort_by_price(combinations: Iterable[Combination],
+                  buffer_size: int = SORT_BUFFER_SIZE
+                  ) -> Iterator[Combination]:
+    """
+    Yields <combinations> sorted by price, combinations with the same
+    price keep their order - the same as sorted() would. At most
+    <buffer_size> of them are kept in memory while they are sorted.
+    """
+    by_price = attrgetter("total_price")
+    runs: List[BinaryIO] = []
+    buffer: List[Combination] = []
+
+    for combination in combinations:
+        buffer.append(combination)
+
+        if len(buffer) == buffer_size:
+            buffer.sort(key=by_price)
+            runs.append(spill_run(buffer))
+            buffer = []
+
+    buffer.sort(key=by_price)
+
+    if not runs:
+        # everything fits in memory
+        yield from buffer
+        return
+
+    if buffer:
+        runs.append(spill_run(buffer))
+        buffer = []
+
+    # when the prices are the same, merge takes the earlier run
+    # first, so the order of the combinations is kept
+    yield from merge(*map(read_run, runs), key=by_price)
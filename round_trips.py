@@ -0,0 +1,128 @@
+"""
+Round trips - every outbound combination A -> B is paired with inbound
+combinations B -> A which depart after the outbound one arrives.
+
+Pairs are found from the cheapest one without creating all of them:
+inbound combinations are sorted by departure, so those which can follow
+an outbound combination are always a suffix of them. The cheapest
+inbound combination in a range is found with a segment tree, every
+outbound combination has the cheapest pair it has not used yet in one
+heap - when it is used, its range is split into two around it.
+"""
+from bisect import bisect_right
+from heapq import heappop, heappush
+from typing import Iterator, List, Sequence, Tuple
+
+from process_airports import Combination, FlightTable
+
+# price of the round trip, position of the outbound combination, price
+# and position of the inbound one, range of inbound combinations
+# (from, to) and position of the cheapest one in the range
+PairCandidate = Tuple[float, int, float, int, int, int, int]
+
+
+class CheapestInRange:
+    """
+    Segment tree over <keys> - position of the smallest key
+    in any range of positions.
+    """
+    def __init__(self, keys: Sequence[Tuple]) -> None:
+        self.keys = keys
+        self.size = len(keys)
+
+        # leaves are positions of the keys, every inner node is
+        # the position of the smaller key of its two children
+        self.tree: List[int] = [0] * self.size + list(range(self.size))
+
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = self.__smaller(self.tree[2 * node],
+                                             self.tree[2 * node + 1])
+
+    def __smaller(self, first: int, second: int) -> int:
+        if self.keys[second] < self.keys[first]:
+            return second
+        return first
+
+    def update(self, position: int) -> None:
+        """The key on <position> has changed"""
+        node = (position + self.size) >> 1
+
+        while node:
+            self.tree[node] = self.__smaller(self.tree[2 * node],
+                                             self.tree[2 * node + 1])
+            node >>= 1
+
+    def position(self, first: int, last: int) -> int:
+        """Position of the smallest key in range [first, last)"""
+        smallest = first
+        first += self.size
+        last += self.size
+
+        while first < last:
+            if first & 1:
+                smallest = self.__smaller(smallest, self.tree[first])
+                first += 1
+            if last & 1:
+                last -= 1
+                smallest = self.__smaller(smallest, self.tree[last])
+            first >>= 1
+            last >>= 1
+
+        return smallest
+
+
+def cheapest_round_trips(
+        outbound: Sequence[Combination],
+        inbound: Sequence[Combination],
+        flights: FlightTable) -> Iterator[Tuple[Combination, Combination]]:
+    """
+    Yields pairs of outbound and inbound combinations, where the inbound
+    combination departs after the outbound one arrives, sorted by their
+    total price. Pairs with the same price are sorted by position of the
+    outbound and then of the inbound combination in the given sequences.
+    """
+    # positions of the inbound combinations sorted by departure
+    by_departure = sorted(
+        range(len(inbound)),
+        key=lambda position: flights.departure[inbound[position].flights[0]])
+    departures = [flights.departure[inbound[position].flights[0]]
+                  for position in by_departure]
+
+    cheapest = CheapestInRange([(inbound[position].total_price, position)
+                                for position in by_departure])
+    candidates: List[PairCandidate] = []
+
+    def push(outbound_position: int, first: int, last: int) -> None:
+        if first == last:
+            return
+
+        middle = cheapest.position(first, last)
+        inbound_position = by_departure[middle]
+        inbound_price = inbound[inbound_position].total_price
+
+        heappush(candidates, (
+            outbound[outbound_position].total_price + inbound_price,
+            outbound_position,
+            inbound_price,
+            inbound_position,
+            first,
+            last,
+            middle))
+
+    for outbound_position, combination in enumerate(outbound):
+        # inbound combinations which depart after the arrival
+        arrival = flights.arrival[combination.flights[-1]]
+        push(outbound_position,
+             bisect_right(departures, arrival),
+             len(departures))
+
+    while candidates:
+        _, outbound_position, _, inbound_position, first, last, middle = \
+            heappop(candidates)
+
+        yield outbound[outbound_position], inbound[inbound_position]
+
+        # the next cheapest pairs of the outbound combination
+        # are on both sides of the used one
+        push(outbound_position, first, middle)
+        push(outbound_position, middle + 1, last)
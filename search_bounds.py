@@ -0,0 +1,67 @@
+"""
+Bounds of one journey of a search - the most flights, the longest travel
+time and the highest total price the customer accepts.
+
+Bounds are checked every time a flight is added to a path, a path over
+any of them is not extended at all - none of its continuations can be
+within the bounds either:
+  - continuations have more flights
+  - they arrive later (flights do not arrive before they depart), so
+    they travel longer
+  - they are not cheaper (prices are not negative)
+A path with the most flights is extended only when it has reached
+the destination already (searches to many destinations).
+
+Layovers the customer accepts are not bounds of paths, they decide which
+flights can follow a flight - see Graph.
+"""
+from typing import Optional, Sequence
+
+from process_airports import FlightTable
+
+# no bound
+UNBOUNDED = float("inf")
+
+
+class SearchBounds:
+    def __init__(self,
+                 flights: FlightTable,
+                 max_legs: Optional[int] = None,
+                 max_travel_time: Optional[int] = None,
+                 max_price: Optional[float] = None) -> None:
+        """
+        :param max_legs: the most flights of a journey
+        :param max_travel_time: seconds from the first departure
+                                to the last arrival
+        :param max_price: total price of a journey with bags
+        """
+        self.flights = flights
+        self.max_legs = UNBOUNDED if max_legs is None else max_legs
+        self.max_travel_time = \
+            UNBOUNDED if max_travel_time is None else max_travel_time
+        self.max_price = UNBOUNDED if max_price is None else max_price
+
+    def allows(self,
+               path: Sequence[int],
+               price: float,
+               is_complete: bool) -> bool:
+        """
+        Is <path> (flight indices) with total <price> within the bounds -
+        is it a journey or can it be extended to one (when it is not
+        complete)?
+        """
+        if price > self.max_price:
+            return False
+
+        flights = self.flights
+        if flights.arrival[path[-1]] - flights.departure[path[0]] \
+                > self.max_travel_time:
+            return False
+
+        if is_complete:
+            return len(path) <= self.max_legs
+        return len(path) < self.max_legs
+
+    def can_extend(self, path: Sequence[int]) -> bool:
+        """Can another flight be added to <path> (within the bounds)?"""
+        return len(path) < self.max_legs
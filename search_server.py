@@ -0,0 +1,298 @@
+"""
+Local HTTP server answering flight searches - the dataset is loaded
+only once and every search uses it.
+
+endpoints (responses are json):
+  GET  /search?origin=IUT&destination=IUQ&bags=1&return=true
+  POST /search   - the same parameters as a json object
+  POST /reload   - loads the dataset again, json object
+                   {"dataset": "path"} loads a different dataset
+  GET  /stats    - hits and misses of the cache of results
+
+search parameters are the same as arguments of solution.py:
+  origin, destination, bags, return, arrival, departure,
+  returnarrival, limit, round_trip, fastest, per_departure, pareto,
+  max_legs, max_travel_time, max_price, min_layover and max_layover
+  (travel time and layovers in minutes)
+
+how to run it:
+python3 -m "search_server" "example/example2.csv" --port=8080
+python3 -m "search_server" "example/example2.csv" --unix=/tmp/flights.sock
+"""
+import argparse
+import asyncio
+import json
+import os.path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from helper_functions import *
+from result_cache import CACHE_BYTES, CACHE_ENTRIES, ResultCache
+from visit_airports import Graph, Query
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error"
+}
+
+# the biggest request body we accept
+MAX_BODY_SIZE = 1 << 20
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, reason: str) -> None:
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+
+
+def request_requirements(parameters: Dict) -> Dict:
+    """Requirements of a search request, see search_requirements"""
+    try:
+        return search_requirements(parameters)
+    except InvalidRequirements as error:
+        raise HttpError(400, str(error))
+
+
+class SearchServer:
+    """Answers searches against one loaded dataset"""
+    def __init__(self,
+                 dataset: str,
+                 index: Optional[str] = None,
+                 cache: Optional[ResultCache] = None) -> None:
+        """
+        :param dataset: path to a .csv dataset
+        :param index: path to a snapshot of the dataset, empty path
+                      = snapshot next to the dataset, None = no snapshot
+        :param cache: cache of search results, None = no cache
+        """
+        self.dataset = dataset
+        self.index = index
+        self.cache = cache
+        self.graph: Graph = self.__load(dataset)
+
+    def __load(self, dataset: str) -> Graph:
+        if not os.path.isfile(dataset):
+            raise HttpError(400, "Given dataset path could not be found")
+
+        index = self.index
+        if index and dataset != self.dataset:
+            # the snapshot path belongs to the previous dataset
+            index = ""
+
+        try:
+            return Graph(dataset=dataset, index=index)
+        except SystemExit:
+            # end_searching - the dataset is not valid
+            raise HttpError(400, "Given dataset is not valid")
+
+    def reload(self, dataset: Optional[str] = None) -> Dict:
+        """
+        Loads the dataset again, searches which are running keep
+        using the previous one.
+        """
+        dataset = dataset or self.dataset
+        graph = self.__load(dataset)
+
+        self.dataset = dataset
+        self.graph = graph
+        return {"dataset": dataset, "flights": len(graph.flights)}
+
+    def search(self, parameters: Dict) -> List[Dict]:
+        """Flight combinations sorted by price, the same as solution.py"""
+        query = Query(**request_requirements(parameters))
+
+        if self.cache is None:
+            return self.graph.search(query)
+
+        # results of a different version of the dataset are not used,
+        # the version is a part of the key
+        return self.cache.search(self.graph, query)
+
+    def stats(self) -> Dict:
+        if self.cache is None:
+            return {"cache": None}
+        return {"cache": self.cache.stats()}
+
+    async def handle(self,
+                     reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        """Answers one HTTP request, then closes the connection"""
+        try:
+            try:
+                method, target, body = await read_request(reader)
+                status, result = 200, await self.__answer(method, target, body)
+            except HttpError as error:
+                status, result = error.status, {"error": error.reason}
+            except Exception as error:
+                status, result = 500, {"error": str(error)}
+
+            await write_response(writer, status, result)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def __answer(self, method: str, target: str, body: bytes):
+        url = urlsplit(target)
+        loop = asyncio.get_running_loop()
+
+        if url.path == "/search":
+            if method == "GET":
+                parameters = dict(parse_qsl(url.query))
+            elif method == "POST":
+                parameters = parse_json_object(body)
+            else:
+                raise HttpError(405, "Use GET or POST")
+
+            # searches run in threads, so the server can accept
+            # other requests in the meantime
+            return await loop.run_in_executor(None, self.search, parameters)
+
+        if url.path == "/reload":
+            if method != "POST":
+                raise HttpError(405, "Use POST")
+
+            parameters = parse_json_object(body) if body else {}
+            return await loop.run_in_executor(None, self.reload,
+                                              parameters.get("dataset"))
+
+        if url.path == "/stats":
+            if method != "GET":
+                raise HttpError(405, "Use GET")
+            return self.stats()
+
+        raise HttpError(404, f"Unknown path {url.path}")
+
+
+def parse_json_object(body: bytes) -> Dict:
+    try:
+        parameters = json.loads(body or b"{}")
+    except ValueError:
+        raise HttpError(400, "Body is not valid json")
+
+    if not isinstance(parameters, dict):
+        raise HttpError(400, "Body has to be a json object")
+
+    return parameters
+
+
+async def read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    """Method, target and body of an HTTP request"""
+    request_line = (await reader.readline()).decode("latin-1").split()
+    if len(request_line) != 3:
+        raise HttpError(400, "Invalid request line")
+
+    method, target, _ = request_line
+
+    content_length = 0
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            try:
+                content_length = parse_optional_int(value.strip())
+            except InvalidRequirements as error:
+                raise HttpError(400, str(error))
+
+    if content_length < 0 or content_length > MAX_BODY_SIZE:
+        raise HttpError(400, "Invalid body size")
+
+    body = await reader.readexactly(content_length)
+    return method.upper(), target, body
+
+
+async def write_response(writer: asyncio.StreamWriter,
+                         status: int,
+                         result) -> None:
+    body = json.dumps(result).encode()
+    head = f"HTTP/1.1 {status} {REASONS[status]}\r\n" \
+        "Content-Type: application/json\r\n" \
+        f"Content-Length: {len(body)}\r\n" \
+        "Connection: close\r\n\r\n"
+
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(server: SearchServer,
+                host: str,
+                port: int,
+                unix_socket: Optional[str]) -> None:
+    if unix_socket is not None:
+        listening = await asyncio.start_unix_server(server.handle,
+                                                    path=unix_socket)
+        print(f"Listening on {unix_socket}", flush=True)
+    else:
+        listening = await asyncio.start_server(server.handle, host, port)
+        print(f"Listening on http://{host}:{port}", flush=True)
+
+    async with listening:
+        await listening.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answers flight searches against one loaded dataset")
+    parser.add_argument("dataset",
+                        type=str,
+                        help="Path to a .csv dataset of available flights")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix",
+                        type=str,
+                        default=None,
+                        help="Listen on a unix socket instead of tcp")
+    parser.add_argument("--index",
+                        type=str,
+                        nargs="?",
+                        const="",
+                        default=None,
+                        help="Load the dataset from its snapshot "
+                             "(default=<dataset>.idx)")
+    parser.add_argument("--cache-entries",
+                        type=int,
+                        default=0,
+                        help="Number of search results kept in the cache, "
+                             "0 = no cache (default=0)")
+    parser.add_argument("--cache-bytes", type=int, default=CACHE_BYTES)
+    parser.add_argument("--cache-ttl",
+                        type=float,
+                        default=None,
+                        help="Number of seconds cached results are valid")
+    parser.add_argument("--cache",
+                        type=str,
+                        default=None,
+                        help="Path to a file the cache is loaded from "
+                             "and stored to when the server stops")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache_entries > 0 or args.cache is not None:
+        cache = ResultCache(args.cache_entries or CACHE_ENTRIES,
+                            args.cache_bytes,
+                            args.cache_ttl,
+                            args.cache)
+
+    try:
+        server = SearchServer(args.dataset, args.index, cache)
+    except HttpError as error:
+        end_searching(error.reason)
+
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cache is not None:
+            cache.save()
+
+
+if __name__ == "__main__":
+    main()
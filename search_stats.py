@@ -0,0 +1,160 @@
+"""
+Where the time of a search goes - phases of the search (reading and
+parsing of the dataset, searching, formatting, writing, ...) are timed
+and the depth first search counts what it has done:
+
+  nodes_expanded      - airports flights were looked up from
+  candidates          - flights looked at as the next flight of a path
+  layover_rejections  - flights which depart from the airport after
+                        the arrival, but before the shortest layover
+  paths_found         - complete paths to the destination
+
+Nothing is measured without a SearchStats object - the functions below
+return the searched things unchanged when stats are None.
+
+Optionally the whole run is profiled by cProfile or tracemalloc,
+see profiling().
+"""
+import cProfile
+import json
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import ContextManager, Dict, Iterable, Iterator, Optional, \
+    TextIO, TypeVar
+
+CPROFILE = "cprofile"
+TRACEMALLOC = "tracemalloc"
+PROFILERS = (CPROFILE, TRACEMALLOC)
+
+# time before the first phase and between phases
+OTHER = "other"
+
+COUNTERS = ["nodes_expanded",
+            "candidates",
+            "layover_rejections",
+            "paths_found"]
+
+T = TypeVar("T")
+
+
+class SearchStats:
+    def __init__(self) -> None:
+        # phase -> seconds spent in it, in the order the phases started
+        self.seconds: Dict[str, float] = {OTHER: 0.0}
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+        # time is added to the current phase when it changes
+        self.__phase = OTHER
+        self.__started = perf_counter()
+
+    def switch(self, phase: str) -> str:
+        """Starts <phase>, returns the phase which was running"""
+        now = perf_counter()
+        self.seconds[self.__phase] = \
+            self.seconds.get(self.__phase, 0.0) + now - self.__started
+
+        previous = self.__phase
+        self.__phase = phase
+        self.__started = now
+        return previous
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        previous = self.switch(phase)
+        try:
+            yield
+        finally:
+            self.switch(previous)
+
+    def timed(self, iterable: Iterable[T], phase: str) -> Iterator[T]:
+        """
+        Yields items of <iterable>, time spent getting them is added
+        to <phase> - phases of lazily chained iterators are timed
+        separately.
+        """
+        iterator = iter(iterable)
+
+        while True:
+            previous = self.switch(phase)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.switch(previous)
+
+            yield item
+
+    def count_expanded(self,
+                       candidates: int,
+                       layover_rejections: int = 0) -> None:
+        """Flights following a flight (or the first ones) were looked up"""
+        counters = self.counters
+        counters["nodes_expanded"] += 1
+        counters["candidates"] += candidates
+        counters["layover_rejections"] += layover_rejections
+
+    def count_paths(self, paths: Iterable[T]) -> Iterator[T]:
+        for path in paths:
+            self.counters["paths_found"] += 1
+            yield path
+
+    def report(self) -> Dict:
+        # the current phase is counted up to now
+        self.switch(self.__phase)
+        return {
+            "seconds": {phase: round(seconds, 6)
+                        for phase, seconds in self.seconds.items()},
+            "total_seconds": round(sum(self.seconds.values()), 6),
+            "counters": self.counters
+        }
+
+    def print_report(self, file: TextIO) -> None:
+        print(json.dumps(self.report()), file=file)
+
+
+def phase(stats: Optional[SearchStats], phase: str) -> ContextManager:
+    """Times the block as <phase>, if there are stats"""
+    if stats is None:
+        return nullcontext()
+    return stats.phase(phase)
+
+
+def timed(stats: Optional[SearchStats],
+          iterable: Iterable[T],
+          phase: str) -> Iterable[T]:
+    """Times getting items of <iterable> as <phase>, if there are stats"""
+    if stats is None:
+        return iterable
+    return stats.timed(iterable, phase)
+
+
+@contextmanager
+def profiling(filename: Optional[str],
+              profiler: str = CPROFILE) -> Iterator[None]:
+    """
+    Profiles the block, the result is written to <filename> - pstats
+    file of cProfile (python3 -m pstats <filename>) or tracemalloc
+    snapshot (tracemalloc.Snapshot.load). Nothing without filename.
+    """
+    if filename is None:
+        yield
+        return
+
+    if profiler == TRACEMALLOC:
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            tracemalloc.take_snapshot().dump(filename)
+            tracemalloc.stop()
+        return
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(filename)
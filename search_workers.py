@@ -0,0 +1,154 @@
+"""
+Pool of processes searching one graph.
+
+The graph is set before the pool is started, forked workers share it
+with the main process (copy-on-write) - only tasks and their results
+are sent between the processes. Columns of the flight table are arrays,
+so workers do not copy them by touching their items. Where fork is not
+available, every worker loads the dataset once (use a snapshot - its
+pages are shared by the system) and applies the same delta.
+
+One search can be split as well - paths starting with different first
+flights do not depend on each other, groups of first flights are
+searched by different workers, see search_in_parallel().
+"""
+import multiprocessing
+from collections import OrderedDict
+from multiprocessing.pool import Pool
+from typing import Iterator, List, Optional, Tuple
+
+from flight_updates import apply_updates, load_delta
+from process_airports import Combination
+from visit_airports import Graph, Query
+
+# how many groups of first flights every worker gets on average -
+# paths from some first flights take much longer to search than from
+# others, more groups keep the workers busy evenly
+GROUPS_PER_WORKER = 4
+
+# graph searched by the workers
+_graph: Optional[Graph] = None
+
+# first flights of one journey searched by one worker - origin,
+# destination, query and positions of the first flights (from, to)
+SubtreeTask = Tuple[str, str, Query, int, int]
+
+
+def _init_worker(dataset: str,
+                 index: Optional[str],
+                 delta: Optional[str]) -> None:
+    global _graph
+
+    if _graph is None:
+        # worker was not forked - loads the dataset on its own
+        _graph = Graph(dataset=dataset, index=index)
+
+        if delta is not None:
+            apply_updates(_graph, load_delta(delta))
+
+
+def set_worker_graph(graph: Graph) -> None:
+    global _graph
+    _graph = graph
+
+
+def worker_graph() -> Graph:
+    """Graph of the current process, see start_workers()"""
+    return _graph
+
+
+def pool_context() -> multiprocessing.context.BaseContext:
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def start_workers(graph: Graph,
+                  processes: int,
+                  dataset: str,
+                  index: Optional[str] = None,
+                  delta: Optional[str] = None) -> Pool:
+    """
+    Pool of <processes> workers searching <graph>, <dataset>, <index>
+    and <delta> (applied to the graph already) are used to load
+    the graph where it can not be forked.
+    """
+    set_worker_graph(graph)
+    return pool_context().Pool(processes,
+                               initializer=_init_worker,
+                               initargs=(dataset, index, delta))
+
+
+def _subtree_paths(task: SubtreeTask) -> List[Tuple[int, ...]]:
+    origin, destination, query, first, last = task
+    return [path for path, _ in _graph.iter_wanted_paths(origin,
+                                                         destination,
+                                                         query,
+                                                         slice(first, last))]
+
+
+def subtree_tasks(graph: Graph,
+                  query: Query,
+                  workers: int) -> Iterator[Tuple[SubtreeTask, bool]]:
+    """
+    Groups of first flights of all journeys of <query> in the order
+    they are searched by Graph.iter_paths, together with information
+    whether it is the return journey.
+    """
+    for origin, destination, is_return, _ in query.journeys():
+        first_flights = graph.count_first_flights(origin, query)
+        group_size = -(-first_flights // (workers * GROUPS_PER_WORKER)) or 1
+
+        for first in range(0, first_flights, group_size):
+            yield (origin,
+                   destination,
+                   query,
+                   first,
+                   first + group_size), is_return
+
+
+def search_in_parallel(
+        pool: Pool,
+        graph: Graph,
+        query: Query,
+        workers: int) -> Iterator[Tuple[Tuple[int, ...], bool]]:
+    """
+    Paths of all journeys of <query> searched by workers of <pool>,
+    in the same order as Graph.iter_wanted_paths yields them - together
+    with information whether the path is a return journey.
+    """
+    tasks = list(subtree_tasks(graph, query, workers))
+
+    # imap keeps the order of the tasks
+    results = pool.imap(_subtree_paths, [task for task, _ in tasks])
+
+    for (_, is_return), paths in zip(tasks, results):
+        for path in paths:
+            yield path, is_return
+
+
+def iter_records(pool: Pool,
+                 graph: Graph,
+                 query: Query,
+                 workers: int) -> Iterator[Combination]:
+    """The same as Graph.iter_records, searched by workers"""
+    flight_combinations = graph.new_combinations(query)
+
+    for path, is_return in search_in_parallel(pool, graph, query, workers):
+        yield flight_combinations.combination(path, is_return)
+
+
+def search(pool: Pool,
+           graph: Graph,
+           query: Query,
+           workers: int) -> List[OrderedDict]:
+    """
+    The same as Graph.search without limit, searched by workers - paths
+    are found in the same order, so the sorted result is the same.
+    """
+    flight_combinations = graph.new_combinations(query)
+
+    for path, is_return in search_in_parallel(pool, graph, query, workers):
+        flight_combinations.add_path(path, is_return)
+
+    return flight_combinations.sorted_combinations()
@@ -1,8 +1,20 @@
 import argparse
+import json
 import os.path
+import sys
+from contextlib import nullcontext
+from typing import ContextManager, Dict, Iterable, Optional, TextIO
 
+import search_workers
+from batch_search import run_batch
+from flight_updates import InvalidDelta, apply_updates, load_delta
 from helper_functions import *
-from visit_airports import Graph
+from process_airports import Combination
+from result_cache import CACHE_BYTES, CACHE_ENTRIES, ResultCache, cache_key
+from result_writer import *
+from search_stats import CPROFILE, PROFILERS, SearchStats, phase, \
+    profiling, timed
+from visit_airports import Graph, Query
 
 
 def init_parser():
@@ -14,9 +26,11 @@ def init_parser():
                         help="Path to a .csv dataset of available flights")
     parser.add_argument("origin",
                         type=str,
+                        nargs="?",
                         help="Origin airport code")
     parser.add_argument("destination",
                         type=str,
+                        nargs="?",
                         help="Destination airport code")
 
     # optional arguments
@@ -52,70 +66,523 @@ def init_parser():
         help="Date and time of the soonest departure from the origin "
              "airport in UTC format (default=None)")
 
+    parser.add_argument(
+        "--round-trip",
+        action="store_true",
+        help="Pair every combination to the destination with combinations "
+             "back which depart after it arrives, sorted by their total "
+             "price - implies --return (default=False)")
+
+    parser.add_argument(
+        "--fastest",
+        action="store_true",
+        help="Print only the combination which arrives the earliest "
+             "(for both journeys of a return flight), found by one scan "
+             "of the flights instead of all combinations (default=False)")
+
+    parser.add_argument(
+        "--per-departure",
+        action="store_true",
+        help="With --fastest, print the fastest combination for every "
+             "departure from the origin - the ones no combination "
+             "departing later arrives sooner than (default=False)")
+
+    parser.add_argument(
+        "--pareto",
+        action="store_true",
+        help="Print only combinations no other combination beats in "
+             "total price, travel time and number of flights at the same "
+             "time (see pareto_search.py) (default=False)")
+
+    parser.add_argument(
+        "--max-legs",
+        type=int,
+        default=None,
+        help="The most flights of one journey (default=None)")
+
+    parser.add_argument(
+        "--max-travel-time",
+        type=int,
+        default=None,
+        help="The longest travel time of one journey in minutes "
+             "(default=None)")
+
+    parser.add_argument(
+        "--max-price",
+        type=float,
+        default=None,
+        help="The highest total price of one journey (default=None)")
+
+    parser.add_argument(
+        "--min-layover",
+        type=int,
+        default=None,
+        help="Layovers between flights have to be longer than this "
+             f"number of minutes (default={MIN_LAYOVER // 60})")
+
+    parser.add_argument(
+        "--max-layover",
+        type=int,
+        default=None,
+        help="Layovers between flights have to be shorter than this "
+             f"number of minutes (default={MAX_LAYOVER // 60})")
+
+    parser.add_argument(
+        "--to-many",
+        action="store_true",
+        help="Destination is a list of airports separated by commas "
+             f"('{ALL_AIRPORTS}' for all airports), combinations to every "
+             "one of them are found by one search from the origin "
+             "(default=False)")
+
+    parser.add_argument(
+        "--matrix",
+        action="store_true",
+        help="Origin and destination are lists of airports separated by "
+             f"commas ('{ALL_AIRPORTS}' for all airports), print the cheapest "
+             "price and the shortest travel time of every pair of them "
+             "(default=False)")
+
+    parser.add_argument(
+        "--unsorted",
+        action="store_true",
+        help="Print flight combinations as they are found instead of "
+             "sorting them by price - keeps memory use low for searches "
+             "with many results (default=False)")
+
+    parser.add_argument(
+        "--index",
+        type=str,
+        nargs="?",
+        const="",
+        default=None,
+        help="Load the dataset from its snapshot (see flights_index.py), "
+             "optionally path to the snapshot (default=<dataset>.idx). "
+             "The snapshot is built again when the dataset changes")
+
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="Print only the N cheapest flight combinations - the search "
+             "stops once they are found (default=None)")
+
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="Path to a file of cached search results shared by runs "
+             "of the script, not used with --unsorted (default=None)")
+
+    parser.add_argument(
+        "--cache-entries",
+        type=int,
+        default=CACHE_ENTRIES,
+        help="Number of results kept in the cache "
+             f"(default={CACHE_ENTRIES})")
+
+    parser.add_argument(
+        "--cache-bytes",
+        type=int,
+        default=CACHE_BYTES,
+        help=f"Size of results kept in the cache (default={CACHE_BYTES})")
+
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=None,
+        help="Number of seconds cached results are valid (default=None)")
+
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help="Print hits and misses of the cache to standard error "
+             "(default=False)")
+
+    parser.add_argument(
+        "--delta",
+        type=str,
+        default=None,
+        help="Path to a .csv file of changes of the dataset (see "
+             "flight_updates.py) applied before searching (default=None)")
+
+    parser.add_argument(
+        "--batch",
+        type=str,
+        default=None,
+        help="Path to a .jsonl file of searches (see batch_search.py) - "
+             "prints results one per line instead of searching for "
+             "origin and destination (default=None)")
+
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of processes answering searches of --batch "
+             "(default=number of cpus)")
+
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes searching paths with different first "
+             "flights at the same time - the output is the same as "
+             "without them, not used with --limit (default=None)")
+
+    parser.add_argument(
+        "--load-processes",
+        type=int,
+        default=None,
+        help="Number of processes parsing chunks of the dataset - "
+             "useful for very large datasets (default=1)")
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Path to a file the combinations are written to "
+             "(default=standard output)")
+
+    output_format = parser.add_mutually_exclusive_group()
+    output_format.add_argument(
+        "--compact",
+        dest="output_format",
+        action="store_const",
+        const=COMPACT,
+        default=PRETTY,
+        help="Write the json list on one line (default=False)")
+    output_format.add_argument(
+        "--ndjson",
+        dest="output_format",
+        action="store_const",
+        const=NDJSON,
+        help="Write one combination per line (default=False)")
+
+    parser.add_argument(
+        "--sort-buffer",
+        type=int,
+        default=SORT_BUFFER_SIZE,
+        help="Number of combinations sorted in memory, more of them are "
+             "sorted using temporary files "
+             f"(default={SORT_BUFFER_SIZE})")
+
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print time of every phase of the search and counters of "
+             "the search (see search_stats.py) to standard error "
+             "(default=False)")
+
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Path to a file the profile of the whole run is written to "
+             "(default=None)")
+
+    parser.add_argument(
+        "--profiler",
+        choices=PROFILERS,
+        default=CPROFILE,
+        help="cprofile - pstats file of function calls, tracemalloc - "
+             f"snapshot of allocated memory (default={CPROFILE})")
+
     return parser.parse_args()
 
 
 def main():
     args = init_parser()
 
-    # checks for valid input
-    if not valid_airport_code(getattr(args, "origin")):
-        end_searching("Invalid origin airport code, e.g. KSC")
+    # nothing is measured without --stats
+    stats = SearchStats() if getattr(args, "stats") else None
+
+    with profiling(args.profile, args.profiler):
+        search_flights(args, stats)
+
+    if stats is not None:
+        stats.print_report(sys.stderr)
+
+
+def search_flights(args: argparse.Namespace,
+                   stats: Optional[SearchStats]) -> None:
+    if getattr(args, "sort_buffer") < 1:
+        end_searching("Sort buffer has to be a positive number")
+
+    if getattr(args, "cache_entries") < 1 or getattr(args, "cache_bytes") < 1:
+        end_searching("Size of the cache has to be a positive number")
+
+    if getattr(args, "workers") is not None and getattr(args, "workers") < 1:
+        end_searching("Number of workers has to be positive")
+
+    if getattr(args, "load_processes") is not None \
+            and getattr(args, "load_processes") < 1:
+        end_searching("Number of processes has to be positive")
+
+    if getattr(args, "batch") is not None:
+        if not os.path.isfile(getattr(args, "dataset")):
+            end_searching("Given dataset path could not be found")
+
+        if not os.path.isfile(getattr(args, "batch")):
+            end_searching("Given batch path could not be found")
+
+        if getattr(args, "processes") is not None \
+                and getattr(args, "processes") < 1:
+            end_searching("Number of processes has to be positive")
+
+        # searches of the batch are split between --processes
+        if getattr(args, "cache") is not None \
+                or getattr(args, "workers") is not None:
+            end_searching("Batch of searches can not be used with cache "
+                          "or workers")
+
+        batch_graph = load_graph(args.__dict__, stats)
+
+        with open_output(args.output) as output, phase(stats, "batch"):
+            run_batch(args.batch,
+                      batch_graph,
+                      args.dataset,
+                      args.index,
+                      args.processes,
+                      output,
+                      args.delta)
+        return
+
+    if getattr(args, "origin") is None \
+            or getattr(args, "destination") is None:
+        end_searching("Origin and destination have to be specified")
+
+    if getattr(args, "limit") is not None:
+        if getattr(args, "limit") < 1:
+            end_searching("Limit has to be a positive number")
+
+        if getattr(args, "unsorted"):
+            end_searching("Limit can not be used with unsorted output")
+
+    if getattr(args, "round_trip") and getattr(args, "unsorted"):
+        end_searching("Round trips can not be used with unsorted output")
+
+    if getattr(args, "fastest") and getattr(args, "unsorted"):
+        end_searching("Fastest journeys can not be used with unsorted output")
+
+    if getattr(args, "pareto") and getattr(args, "unsorted"):
+        end_searching("Pareto optimal journeys can not be used with unsorted "
+                      "output")
+
+    if (getattr(args, "to_many") or getattr(args, "matrix")) \
+            and (getattr(args, "unsorted")
+                 or getattr(args, "cache") is not None
+                 or (getattr(args, "workers") or 1) > 1):
+        end_searching("Searches to many airports can not be used with "
+                      "unsorted output, cache or workers")
+
+    # checks for valid input + converts times --> if something
+    # is invalid, exits the code
+    try:
+        args = check_requirements(args.__dict__)
+    except InvalidRequirements as error:
+        end_searching(str(error))
+
+    # the graph holds all flights of the dataset, the customer's
+    # requirements are checked while it is being searched
+    all_flights_graph = load_graph(args, stats)
+    query = Query(**args)
+
+    with open_output(args["output"]) as output:
+        if args["to_many"] or args["matrix"]:
+            write_many_airports(all_flights_graph, query, args, output)
+            return
+
+        if args["cache"] is not None and not args["unsorted"]:
+            write_cached_result(all_flights_graph, query, args, output)
+            return
+
+        if args["fastest"] or args["pareto"]:
+            # only some of the combinations are searched for
+            with phase(stats, "search"):
+                combinations = all_flights_graph.search(query)
+
+            with phase(stats, "write"):
+                write_combinations(combinations,
+                                   output,
+                                   args["output_format"])
+            return
+
+        if args["round_trip"]:
+            write_round_trips(all_flights_graph, query, args, output)
+            return
+
+        if args["limit"] is not None:
+            # the cheapest combinations are found already sorted
+            with phase(stats, "write"):
+                write_combinations(
+                    timed(stats,
+                          all_flights_graph.iter_cheapest_combinations(query),
+                          "search"),
+                    output,
+                    args["output_format"])
+            return
+
+        if args["workers"] is not None and args["workers"] > 1:
+            # first flights of the journeys are split between the workers
+            with search_workers.start_workers(all_flights_graph,
+                                              args["workers"],
+                                              args["dataset"],
+                                              args["index"],
+                                              args["delta"]) as pool:
+                write_found_combinations(
+                    all_flights_graph,
+                    query,
+                    search_workers.iter_records(
+                        pool, all_flights_graph, query, args["workers"]),
+                    args,
+                    output)
+            return
+
+        # visits all the vertices - from destination to origin as well
+        # if it is a return flight, combinations are written while
+        # they are found or sorted by price
+        write_found_combinations(all_flights_graph,
+                                 query,
+                                 all_flights_graph.iter_records(query),
+                                 args,
+                                 output)
+
+
+def load_graph(args: Dict, stats: Optional[SearchStats]) -> Graph:
+    """Graph of the dataset with the delta applied"""
+    graph = Graph(dataset=args["dataset"],
+                  index=args["index"],
+                  stats=stats,
+                  load_processes=args["load_processes"])
+
+    if args["delta"] is not None:
+        try:
+            with phase(stats, "delta"):
+                apply_updates(graph, load_delta(args["delta"]))
+        except (OSError, InvalidDelta) as error:
+            end_searching(str(error))
+
+    return graph
+
+
+def open_output(filename: Optional[str]) -> ContextManager[TextIO]:
+    if filename is None:
+        # standard output is not closed at the end
+        return nullcontext(sys.stdout)
+    return open(filename, "w")
+
+
+def write_cached_result(graph: Graph,
+                        query: Query,
+                        args: Dict,
+                        output: TextIO) -> None:
+    """The whole result is kept, so it can be stored in the cache"""
+    cache = ResultCache(args["cache_entries"],
+                        args["cache_bytes"],
+                        args["cache_ttl"],
+                        args["cache"])
+    key = cache_key(query, graph.dataset_version())
+
+    with phase(graph.stats, "cache"):
+        result = cache.get(key)
+
+    if result is None:
+        if args["workers"] is not None and args["workers"] > 1 \
+                and not query.round_trip and query.limit is None \
+                and not query.fastest and not query.pareto:
+            with search_workers.start_workers(graph,
+                                              args["workers"],
+                                              args["dataset"],
+                                              args["index"],
+                                              args["delta"]) as pool:
+                result = search_workers.search(pool,
+                                               graph,
+                                               query,
+                                               args["workers"])
+        else:
+            with phase(graph.stats, "search"):
+                result = graph.search(query)
+
+        with phase(graph.stats, "cache"):
+            cache.put(key, result)
+
+    with phase(graph.stats, "write"):
+        write_combinations(result, output, args["output_format"])
 
-    if not valid_airport_code(getattr(args, "destination")):
-        end_searching("Invalid destination airport code, e.g. CDG")
+    with phase(graph.stats, "cache"):
+        cache.save()
 
-    if not os.path.isfile(getattr(args, "dataset")):
-        end_searching("Given dataset path could not be found")
+    if args["cache_stats"]:
+        print(json.dumps(cache.stats()), file=sys.stderr)
 
-    if not getattr(args, "origin") != getattr(args, "destination"):
-        end_searching(
-            "Origin and destination airports can not be the same")
 
-    if getattr(args, "returnarrival") and not getattr(args, "return"):
-        end_searching(
-            "Return arrival was specified but it is not a return flight")
+def write_many_airports(graph: Graph,
+                        query: Query,
+                        args: Dict,
+                        output: TextIO) -> None:
+    """
+    Combinations to every destination, or the cheapest price and
+    the shortest travel time of every pair of airports
+    """
+    destinations = airport_list(args["destination"])
 
-    args = args.__dict__
+    with phase(graph.stats, "search"):
+        if args["matrix"]:
+            result = graph.travel_matrix(query,
+                                         airport_list(args["origin"]),
+                                         destinations)
+        else:
+            result = graph.search_destinations(query, destinations)
 
-    # checks for valid input + converts --> if invalid time
-    # format, exits the code
-    if args["arrival"] is not None:
-        args["arrival"] = str_to_datetime(args["arrival"])
+    with phase(graph.stats, "write"):
+        write_combinations(result, output, args["output_format"])
 
-    if args["departure"] is not None:
-        args["departure"] = str_to_datetime(args["departure"])
 
-    if args["returnarrival"] is not None:
-        args["returnarrival"] = str_to_datetime(args["returnarrival"])
+def write_round_trips(graph: Graph,
+                      query: Query,
+                      args: Dict,
+                      output: TextIO) -> None:
+    if args["workers"] is not None and args["workers"] > 1:
+        # combinations of both journeys are searched by the workers,
+        # they are paired afterwards
+        with search_workers.start_workers(graph,
+                                          args["workers"],
+                                          args["dataset"],
+                                          args["index"],
+                                          args["delta"]) as pool:
+            records = list(search_workers.iter_records(
+                pool, graph, query, args["workers"]))
+    else:
+        records = timed(graph.stats, graph.iter_records(query), "search")
 
-    # valid input check - does customer want to arrive to the
-    # destination sooner than he leaves?
-    if args["arrival"] is not None and args["departure"] is not None:
+    with phase(graph.stats, "write"):
+        write_combinations(
+            timed(graph.stats, graph.iter_round_trips(query, records), "pair"),
+            output,
+            args["output_format"])
 
-        # we have already converted arrival and departure from str
-        # to datetime objects if both were not none, now we can compare
-        # them as datetime objects
-        if args["arrival"] < args["departure"]:
-            end_searching("Arrival is sooner than departure")
 
-    # valid input check - does he want to arrive home sooner than he leaves?
-    if args["returnarrival"] is not None and args["departure"] is not None:
-        if args["returnarrival"] < args["departure"]:
-            end_searching()
+def write_found_combinations(graph: Graph,
+                             query: Query,
+                             combinations: Iterable[Combination],
+                             args: Dict,
+                             output: TextIO) -> None:
+    # phases of the lazily chained combinations are timed separately
+    stats = graph.stats
+    combinations = timed(stats, combinations, "search")
 
-    all_flights_graph = Graph(**args)
-    all_flights_graph.visit_all_vertices(origin=args["origin"],
-                                         destination=args["destination"])
+    if not args["unsorted"]:
+        combinations = timed(stats,
+                             sort_by_price(combinations, args["sort_buffer"]),
+                             "sort")
 
-    # if it is a return flight, we need to visit vertices from
-    # destination to origin
-    if args["return"]:
-        all_flights_graph.visit_all_vertices(origin=args["destination"],
-                                             destination=args["origin"])
+    # combinations are formatted only when they are written
+    formatted = graph.new_combinations(query).format_combinations(combinations)
 
-    # after having visited all the vertices, print all flight combinations
-    all_flights_graph.print_found_combinations()
+    with phase(stats, "write"):
+        write_combinations(timed(stats, formatted, "format"),
+                           output,
+                           args["output_format"])
 
 
 if __name__ == "__main__":
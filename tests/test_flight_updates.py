@@ -0,0 +1,106 @@
+"""
+Delta applied to a graph loaded from a snapshot of the dataset has to
+give the same results as a graph built from the edited dataset.
+
+how to run it:
+python3 -m unittest discover tests
+"""
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+from itertools import permutations
+
+from flight_updates import apply_updates, load_delta
+from flights_index import default_snapshot_filename, load_snapshot
+from visit_airports import Graph, Query
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), "..", "example",
+                       "example3.csv")
+
+HEADER = "action,flight_no,origin,destination,departure,arrival," \
+         "base_price,bag_price,bags_allowed\n"
+
+APPENDED = "ZH214,WUE,NNB,2021-09-01T23:20:00,2021-09-02T01:50:00,16.0,9,2"
+
+MOVED_ARRIVAL = "2021-09-01T03:25:00"
+
+
+class DeltaOnSnapshotTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.dataset = os.path.join(self.directory, "flights.csv")
+        shutil.copy(EXAMPLE, self.dataset)
+
+        with open(self.dataset) as file:
+            self.lines = file.read().splitlines()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def write(self, filename: str, lines) -> str:
+        path = os.path.join(self.directory, filename)
+        with open(path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        return path
+
+    def results(self, graph: Graph):
+        """Combinations of all pairs of airports, ordered the same way"""
+        results = dict()
+        for origin, destination in permutations(
+                sorted(graph.flights.airports), 2):
+            combinations = graph.search(Query(origin=origin,
+                                              destination=destination,
+                                              bags=1))
+            results[origin, destination] = sorted(
+                json.dumps(combination) for combination in combinations)
+        return results
+
+    def check_delta(self, searched: bool) -> None:
+        """
+        Applies the delta to a graph loaded from the snapshot, which is
+        <searched> before - cached reachability of its destinations is
+        changed by the delta then, not created again.
+        """
+        # the first flight is deleted, the second one is updated,
+        # the third one arrives later (it is deleted and added again)
+        deleted = self.lines[1].split(",")
+        updated = self.lines[2].split(",")
+        moved = self.lines[3].split(",")
+
+        delta = self.write("delta.csv", [
+            HEADER.strip(),
+            f"append,{APPENDED}",
+            f"delete,{deleted[0]},,,{deleted[3]},,,,",
+            f"update,{updated[0]},,,{updated[3]},,199.0,,",
+            f"update,{moved[0]},,,{moved[3]},{MOVED_ARRIVAL},,,"])
+
+        # the snapshot is written, the graph reads its memory mapped file
+        load_snapshot(self.dataset)
+        self.assertTrue(os.path.isfile(
+            default_snapshot_filename(self.dataset)))
+
+        graph = Graph(dataset=self.dataset, index="")
+        if searched:
+            self.results(graph)
+        apply_updates(graph, load_delta(delta))
+
+        updated[5] = "199.0"
+        moved[4] = MOVED_ARRIVAL
+        edited = self.write("edited.csv",
+                            [self.lines[0], ",".join(updated)]
+                            + self.lines[4:]
+                            + [APPENDED, ",".join(moved)])
+
+        self.assertEqual(self.results(graph),
+                         self.results(Graph(dataset=edited)))
+
+    def test_delta_on_snapshot(self) -> None:
+        self.check_delta(searched=False)
+
+    def test_delta_after_searches(self) -> None:
+        self.check_delta(searched=True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,299 +1,1220 @@
-from datetime import datetime, time, timedelta
-from json import dumps
-from typing import Dict, List, Optional, Set
+import hashlib
+import json
+import threading
+import uuid
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+from heapq import heappop, heappush, heapreplace, merge
+from itertools import islice
+from operator import attrgetter
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, \
+    Optional, Sequence, Set, Tuple, TypeVar, Union
 
-from helper_functions import FLIGHT_INFORMATION, end_searching
-from process_airports import Flight, FlightCombinations
+from connection_scan import ConnectionScan
+from flights_index import Snapshot, build_snapshot, load_snapshot, \
+    source_key
+from pareto_search import pareto_paths
+from helper_functions import MAX_LAYOVER, MIN_LAYOVER, datetime_to_epoch
+from process_airports import Combination, DepartureIndex, FlightCombinations, \
+    FlightTable
+from reachability import Reachability, departure_order
+from round_trips import cheapest_round_trips
+from search_bounds import SearchBounds
+from search_stats import SearchStats
 
+# for how many destinations reachability of flights is kept
+REACHABILITY_CACHE_SIZE = 16
 
-class Graph:
+# one journey of a search - origin, destination, is it the return
+# journey and the soonest arrival the customer has specified for it
+Journey = Tuple[str, str, bool, Optional[int]]
+
+# the shortest and the longest layover between two flights (seconds)
+Layovers = Tuple[int, int]
+DEFAULT_LAYOVERS = (MIN_LAYOVER, MAX_LAYOVER)
+
+# reachability of flights is kept for destinations and layovers
+ReachabilityKey = Tuple[Union[int, FrozenSet[int]], Layovers]
+
+T = TypeVar("T")
+
+
+def optional_epoch(time: Optional[datetime]) -> Optional[int]:
+    if time is None:
+        return None
+    return datetime_to_epoch(time)
+
+
+def optional_seconds(minutes: Optional[int]) -> Optional[int]:
+    if minutes is None:
+        return None
+    return minutes * 60
+
+
+class Query:
+    """
+    Customer's requirements of one search - the same as arguments
+    of solution.py, times are datetime objects.
+    """
     def __init__(self, **customer_requirements) -> None:
+        self.origin: str = customer_requirements["origin"]
+        self.destination: str = customer_requirements["destination"]
+        self.bags: int = customer_requirements.get("bags") or 0
+        # outbound and inbound combinations are paired into round trips
+        self.round_trip: bool = customer_requirements.get("round_trip", False)
+        self.with_return: bool = \
+            customer_requirements.get("return", False) or self.round_trip
+
+        # soonest departure and arrivals - as seconds since epoch
+        self.departure = optional_epoch(customer_requirements.get("departure"))
+        self.arrival = optional_epoch(customer_requirements.get("arrival"))
+        self.return_arrival = \
+            optional_epoch(customer_requirements.get("returnarrival"))
+
+        # how many of the cheapest combinations the customer wants
+        self.limit: Optional[int] = customer_requirements.get("limit")
+
+        # the earliest arriving journey instead of all of them, or
+        # the earliest arriving one for every departure from the origin
+        self.fastest: bool = customer_requirements.get("fastest", False)
+        self.per_departure: bool = \
+            customer_requirements.get("per_departure", False)
+
+        # only combinations no other one beats in price, travel time
+        # and number of flights
+        self.pareto: bool = customer_requirements.get("pareto", False)
+
+        # bounds of every journey (see search_bounds.py), None when
+        # there is no bound - times are given in minutes
+        self.max_legs: Optional[int] = customer_requirements.get("max_legs")
+        self.max_travel_time = \
+            optional_seconds(customer_requirements.get("max_travel_time"))
+        self.max_price: Optional[float] = \
+            customer_requirements.get("max_price")
+
+        # layovers between two flights (in minutes) have to be longer
+        # than the minimum and shorter than the maximum
+        min_layover = \
+            optional_seconds(customer_requirements.get("min_layover"))
+        max_layover = \
+            optional_seconds(customer_requirements.get("max_layover"))
+        self.min_layover: int = \
+            MIN_LAYOVER if min_layover is None else min_layover
+        self.max_layover: int = \
+            MAX_LAYOVER if max_layover is None else max_layover
+
+    @property
+    def layovers(self) -> Layovers:
+        return self.min_layover, self.max_layover
+
+    def search_bounds(self, flights: FlightTable) -> Optional[SearchBounds]:
+        """Bounds of the journeys, None when there are none"""
+        if self.max_legs is None and self.max_travel_time is None \
+                and self.max_price is None:
+            return None
+
+        return SearchBounds(flights,
+                            self.max_legs,
+                            self.max_travel_time,
+                            self.max_price)
+
+    def journeys(self) -> List[Journey]:
+        """Journey A -> B and if it is a return flight also B -> A"""
+        journeys = [(self.origin, self.destination, False, self.arrival)]
+
+        if self.with_return:
+            journeys.append((self.destination,
+                             self.origin,
+                             True,
+                             self.return_arrival))
+
+        return journeys
+
+
+class Graph:
+    def __init__(self,
+                 dataset: Optional[str] = None,
+                 index: Optional[str] = None,
+                 snapshot: Optional[Snapshot] = None,
+                 stats: Optional[SearchStats] = None,
+                 load_processes: Optional[int] = None) -> None:
         """
-        Imports nodes from a csv file and creates an adjacency list
-        of possible flights (the ones in compliance with the customer
-        requirements).
-
-        Graph structure:
-        {
-            "origin airport1": {
-                "destination airport 1 (paris)": {
-                    date (YYYYMMDD): [0, 1, 4],
-                    20221025: [2]
-                },
-                "bordeaux": {
-                    20221023: [3, 5]
-                }
-            }
-        }
+        Imports nodes from a csv file <dataset> (or its snapshot) and
+        creates an index of all flights - see DepartureIndex.
 
+        :param index: path to a snapshot of the dataset, empty path
+                      = snapshot next to the dataset, None = no snapshot
+        :param snapshot: already loaded dataset
+        :param stats: phases of loading and searches are measured
+        :param load_processes: number of processes parsing the dataset
+
+        The graph does not depend on the customer's requirements, they
+        are checked while the graph is searched - see search(). One
+        graph can answer any number of searches.
         In our graph, we only store indices of fligths.
         """
-        # stores relationships between nodes - flights
-        self.graph: Dict[str, Dict[str, Dict[int, List[int]]]] = dict()
+        if snapshot is None:
+            # parses all flights of the dataset into the flight table,
+            # header row gives us categories / csv columns in their
+            # original order - specific for the current dataset
+            if index is None:
+                snapshot = build_snapshot(dataset, stats, load_processes)
+            else:
+                snapshot = load_snapshot(dataset,
+                                         index or None,
+                                         stats,
+                                         load_processes)
 
         # stores nodes - flights in the same order they are in
         # the .csv file we will then access them through indices
-        self.flights: List[Flight] = []
+        self.flights: FlightTable = snapshot.flights
+        self.flight_categories = snapshot.flight_categories
+
+        # stores relationships between nodes - flights
+        self.departure_index: DepartureIndex = snapshot.departure_index
+
+        # flights which can reach a destination - the least recently
+        # used destination is removed when there are too many of them
+        self.__reachability: "OrderedDict[ReachabilityKey, Reachability]" = \
+            OrderedDict()
+        # searches of the server use the graph from more threads
+        self.__reachability_lock = threading.Lock()
+        self.__departure_order: Optional[Tuple[List[int], array]] = None
+
+        # changes with every update of the flights
+        self.version = 0
+
+        # what the graph was created from - the dataset (a graph
+        # created from a snapshot object is unique), delta files applied
+        # to its snapshot and all updates since then, see dataset_version
+        self.source = source_key(dataset) if dataset is not None \
+            else {"graph": uuid.uuid4().hex}
+        self.deltas = snapshot.deltas
+        self.__changes = hashlib.sha256()
+
+        # counters of searches, see search_stats.py
+        self.stats = stats
+
+    def search(self, query: Query) -> List[OrderedDict]:
+        """
+        Flight combinations of all journeys of <query> sorted by price
+        (only the cheapest ones if the query has a limit).
+        """
+        if query.fastest:
+            return self.search_fastest(query)
+
+        if query.pareto:
+            return self.search_pareto(query)
+
+        if query.round_trip:
+            return list(self.iter_round_trips(query))
+
+        if query.limit is not None:
+            return list(self.iter_cheapest_combinations(query))
+
+        flight_combinations = self.new_combinations(query)
+
+        for origin, destination, _, _ in query.journeys():
+            self.visit_all_vertices(origin,
+                                    destination,
+                                    query,
+                                    flight_combinations)
+
+        return flight_combinations.sorted_combinations()
+
+    def new_combinations(self, query: Query) -> FlightCombinations:
+        """Class instance to keep track of possible flights for <query>"""
+        return FlightCombinations(query.destination,
+                                  query.origin,
+                                  query.bags,
+                                  self.flights,
+                                  self.flight_categories)
+
+    def append_flight(self, flight: Dict) -> int:
+        """
+        Adds a new flight (see FlightTable.append_flight) to the graph,
+        returns its index.
+        """
+        self.flights.make_writable()
+        flight_index = self.flights.append_flight(flight)
+        position = self.departure_index.insert_flight(self.flights,
+                                                      flight_index)
+
+        # positions of flights from the airport have changed
+        self.__departure_order = None
+
+        # destinations which may be reached through the new flight
+        # have to be created again
+        with self.__reachability_lock:
+            for destination, reachability in \
+                    list(self.__reachability.items()):
+                if not reachability.insert_flight(self.flights,
+                                                  flight_index,
+                                                  position):
+                    del self.__reachability[destination]
+
+        self.__change("append", flight)
+        return flight_index
+
+    def delete_flight(self, flight_index: int) -> None:
+        """
+        The flight is not used by searches anymore, indices
+        of other flights do not change.
+        """
+        self.flights.make_writable()
+        self.flights.delete_flight(flight_index)
 
-        # keeps track of how many flights were put into our graph
-        self.flights_counter = 0
+        with self.__reachability_lock:
+            for reachability in self.__reachability.values():
+                reachability.delete_flight(self.flights, flight_index)
 
-        # gather information about the customer's requirements -->
-        # to use them when creating the output and checking
-        # for possible flights
-        self.bags = customer_requirements["bags"]
-        self.destination = customer_requirements["destination"]
-        self.origin = customer_requirements["origin"]
+        self.__change("delete", flight_index)
 
-        # soonest arrivals
-        self.arrival: Optional[datetime] = customer_requirements["arrival"]
-        self.return_arrival: Optional[datetime] = \
-            customer_requirements["returnarrival"]
+    def update_flight(self, flight_index: int, changes: Dict) -> int:
+        """
+        Changes values of the flight which are not None in <changes>,
+        returns index of the flight - the flight is deleted and added
+        again when it flies somewhere else or at a different time.
+        """
+        current = self.flights.get_flight(flight_index)
+        flight = dict(current)
+        flight.update((category, value) for category, value
+                      in changes.items() if value is not None)
 
-        csv_filename = customer_requirements["dataset"]
-        with open(csv_filename, "r") as file:
-            flights_file = file.readlines()
+        if any(flight[category] != current[category]
+               for category in ("origin", "destination", "arrival")):
+            self.delete_flight(flight_index)
+            return self.append_flight(flight)
 
-        # use header row to get categories / csv columns in their
-        # original order - specific for the current dataset
-        flight_categories = flights_file[0].strip().split(",")
+        # prices and bags do not change the index
+        self.flights.make_writable()
+        self.flights.base_price[flight_index] = flight["base_price"]
+        self.flights.bag_price[flight_index] = flight["bag_price"]
+        self.flights.bags_allowed[flight_index] = flight["bags_allowed"]
 
-        # checks if the dataset is valid - according to the assignment
-        # it is okay if:
-        #   - the columns do not have the same order in
-        #       different datasets
-        #   - there are more columns than the ones we need
-        if self.__less_categories(flight_categories):
-            end_searching("Some columns is the dataset are missing.")
+        self.__change("update", flight_index, changes)
+        return flight_index
 
-        # add nodes - flights, skip the header row
-        self.__add_nodes(flights_file[1:], flight_categories, customer_requirements)
+    def __change(self, *change) -> None:
+        self.version += 1
+        self.__changes.update(json.dumps(change, sort_keys=True).encode())
 
-        # class instance to keep track of all possible flights
-        # for this search
-        self.flight_combinations = FlightCombinations(self.destination,
-                                                      self.origin,
-                                                      self.bags,
-                                                      self.flights,
-                                                      flight_categories)
+    def dataset_version(self) -> str:
+        """
+        Identifies flights of the graph - graphs created from the same
+        dataset with the same changes have the same version. Every
+        change of the flights changes it, cached results of all
+        searches are not used anymore (see result_cache.py).
+        """
+        version = json.dumps([self.source,
+                              self.deltas,
+                              self.__changes.hexdigest()],
+                             sort_keys=True)
+        return hashlib.sha256(version.encode()).hexdigest()
 
-    def __add_nodes(self,
-                    file_lines_flights: List[str],
-                    flight_categories: List[str],
-                    customer_requirements: Dict) -> None:
-        for line in file_lines_flights:
-            new_flight = Flight(line, flight_categories)
+    def reachability(self,
+                     destination: Union[int, FrozenSet[int]],
+                     layovers: Layovers = DEFAULT_LAYOVERS
+                     ) -> Reachability:
+        """
+        Which flights can reach <destination> (id of the airport)
+        or one of the destinations (ids of the airports) with layovers
+        between the shortest and the longest one.
+        """
+        key = (destination, layovers)
+
+        with self.__reachability_lock:
+            reachability = self.__reachability.get(key)
+
+            if reachability is not None:
+                self.__reachability.move_to_end(key)
+                return reachability
 
-            # check if this flight meets all the requirements
-            # from input - if not, we will not add it to the graph
-            if customer_requirements["bags"] \
-                    <= new_flight.flight_data["bags_allowed"]:
-                # default number of bags is 0
+        # created without the lock, searches to other destinations
+        # do not wait for it
+        reachability = Reachability(self.flights,
+                                    self.departure_index,
+                                    destination,
+                                    self.__get_departure_order(),
+                                    *layovers)
 
-                flight_departure: datetime = \
-                    new_flight.flight_data["departure"]
-                customer_departure: Optional[datetime] = \
-                    customer_requirements["departure"]
+        with self.__reachability_lock:
+            self.__reachability[key] = reachability
+            self.__reachability.move_to_end(key)
 
-                # we can add a flight to our graph only if the customer
-                # hasnt specified the soonest departure date or a
-                # flight departure is after the desired departure date
-                if customer_departure is None \
-                        or flight_departure > customer_departure:
-                        self.__add_flight(new_flight)
+            while len(self.__reachability) > REACHABILITY_CACHE_SIZE:
+                self.__reachability.popitem(last=False)
 
-    def __less_categories(self, flight_categories: List[str]) -> bool:
+        return reachability
+
+    def __get_departure_order(self) -> Tuple[List[int], array]:
+        """All flights sorted by departure, see departure_order()"""
+        if self.__departure_order is None:
+            self.__departure_order = departure_order(self.flights,
+                                                     self.departure_index)
+        return self.__departure_order
+
+    def __first_flights(self,
+                        airport: int,
+                        query: Optional[Query],
+                        first: Optional[slice] = None) -> Sequence[int]:
         """
-        Determines if the given .csv file has the all the columns as
-        is specified in the assignment - checks if our .csv is valid
+        Indices of flights from <airport> which depart after the soonest
+        departure the customer has specified, only <first> of them
+        if it is given.
         """
-        return len(set(flight_categories)) < len(set(FLIGHT_INFORMATION))
+        flights = self.departure_index.departure_flights[airport]
+
+        if query is not None and query.departure is not None:
+            departure_times = self.departure_index.departure_times[airport]
+            flights = flights[bisect_right(departure_times, query.departure):]
 
+        if first is not None:
+            flights = flights[first]
 
-    def __add_airport(self, airport_code: str) -> None:
+        return flights
+
+    def count_first_flights(self, origin: str, query: Query) -> int:
+        """Number of flights a path from <origin> can start with"""
+        origin_id = self.flights.airport_ids.get(origin)
+        if origin_id is None:
+            return 0
+        return len(self.__first_flights(origin_id, query))
+
+    def __next_flights(self,
+                       airport: int,
+                       arrival_time: int,
+                       min_layover: int = MIN_LAYOVER,
+                       max_layover: int = MAX_LAYOVER) -> Sequence[int]:
         """
-        Adds a vertex to the graph of airports.
+        Indices of flights from <airport> which depart more than
+        1 hour and less than 6 hours (or <min_layover> and <max_layover>
+        seconds) after <arrival_time>.
         """
-        self.graph[airport_code] = dict()
+        departure_times = self.departure_index.departure_times[airport]
+        first = bisect_right(departure_times, arrival_time + min_layover)
+        last = bisect_left(departure_times, arrival_time + max_layover, first)
+        return self.departure_index.departure_flights[airport][first:last]
 
-    def __add_flight(self, flight_information: Flight) -> None:
+    def __counted_next_flights(
+            self,
+            query: Optional[Query] = None
+    ) -> Callable[[int, int], Sequence[int]]:
         """
-        Adds an edge to the graph between the origin
-        and destination airport.
+        __next_flights with layovers of <query>, which counts
+        the expanded airports and flights looked at when there are
+        stats - nothing is counted otherwise.
         """
-        origin_airport = flight_information.flight_data["origin"]
-        destination_airport = flight_information.flight_data["destination"]
+        next_flights = self.__next_flights
+        min_layover = MIN_LAYOVER
+
+        if query is not None and query.layovers != DEFAULT_LAYOVERS:
+            min_layover, max_layover = query.layovers
+            next_flights = partial(self.__next_flights,
+                                   min_layover=min_layover,
+                                   max_layover=max_layover)
+
+        if self.stats is None:
+            return next_flights
+
+        stats = self.stats
+        departure_index = self.departure_index
+
+        def counted_next_flights(airport: int,
+                                 arrival_time: int) -> Sequence[int]:
+            flights = next_flights(airport, arrival_time)
 
-        departure_date = \
-            self.__datetime_to_int(flight_information.flight_data["departure"])
+            # flights departing before the shortest layover ends
+            departure_times = departure_index.departure_times[airport]
+            too_soon = bisect_right(departure_times,
+                                    arrival_time + min_layover) \
+                - bisect_right(departure_times, arrival_time)
 
-        if destination_airport not in self.graph:
-            self.__add_airport(destination_airport)
+            stats.count_expanded(len(flights), too_soon)
+            return flights
 
-        if origin_airport not in self.graph:
-            self.__add_airport(origin_airport)
+        return counted_next_flights
 
-        if destination_airport not in self.graph[origin_airport]:
-            self.graph[origin_airport][destination_airport] = dict()
+    def __counted_paths(self, paths: Iterator[T]) -> Iterator[T]:
+        if self.stats is None:
+            return paths
+        return self.stats.count_paths(paths)
 
-        if departure_date not in \
-                self.graph[origin_airport][destination_airport]:
-            self.graph[origin_airport][destination_airport][departure_date] = []
-            self.graph[origin_airport][destination_airport][departure_date].\
-                append(self.flights_counter)
+    def iter_paths(self,
+                   origin: str,
+                   destination: str,
+                   query: Optional[Query] = None,
+                   first: Optional[slice] = None) -> Iterator[Tuple[int, ...]]:
+        """
+        Yields all paths from <origin> to <destination> as tuples
+        of flight indices, one at a time. Only flights which meet
+        the bags and departure requirements of <query> are used.
+        With <first>, only paths starting with these first flights
+        (positions among all possible first flights) are yielded.
+        """
+        # airports are stored as ids in the graph
+        origin_id = self.flights.airport_ids.get(origin)
+        destination_id = self.flights.airport_ids.get(destination)
+
+        if origin_id is None or destination_id is None:
+            return iter(())
 
-        self.flights.append(flight_information)
-        self.flights_counter += 1
+        return self.__depth_first_paths(origin_id,
+                                        frozenset((destination_id,)),
+                                        query,
+                                        first)
 
-    def visit_all_vertices(self, origin: str, destination: str):
+    def __depth_first_paths(
+            self,
+            origin_id: int,
+            destination_ids: FrozenSet[int],
+            query: Optional[Query] = None,
+            first: Optional[slice] = None) -> Iterator[Tuple[int, ...]]:
         """
-        All paths from <origin> to <destination>
+        Paths from <origin_id> to any of <destination_ids>, see iter_paths
+        and iter_paths_to_many.
+
+        Depth first search with an explicit stack - every item of the
+        stack is an iterator over flights that can follow the flight
+        on the same position in the path.
         """
-        # stores indices of flights on given path
-        path_indices = []
+        destinations = self.flights.destination
+        arrivals = self.flights.arrival
+        bags_allowed = self.flights.bags_allowed
+        bags = query.bags if query is not None else 0
+
+        layovers = query.layovers if query is not None else DEFAULT_LAYOVERS
+
+        # a path to one of many destinations is continued to the other
+        # ones, a path to the only destination is complete
+        to_many = len(destination_ids) > 1
 
-        # how it searches the flights:
-        # from the city we are in right now, we have to look how to get
-        # to other cities but we have to look for flights that comply
-        # with the arrival date of the current flight
+        # flights from which no destination can be reached in time
+        # are skipped - there is no path through them
+        reaches = self.reachability(
+            destination_ids if to_many else next(iter(destination_ids)),
+            layovers).reaches
+
+        # counts what the search does, if there are stats
+        next_flights = self.__counted_next_flights(query)
+
+        # paths over bounds of the journey are not extended, prices
+        # of the path without flights, with the first flight, ...
+        bounds = query.search_bounds(self.flights) \
+            if query is not None else None
+        prices: List[float] = [0.0]
+
+        # stores indices of flights on current path
+        path: List[int] = []
+
+        # keeps track of vertices in current path
+        visited: Set[int] = {origin_id}
 
         # first we look for all the flights that originate
         # in customer's city of origin = here we only find
         # the first flight
+        first_flights = self.__first_flights(origin_id, query, first)
+        if self.stats is not None:
+            self.stats.count_expanded(len(first_flights))
 
-        if origin in self.graph:
-            for dest_city in self.graph[origin]:
-                for departure_date in self.graph[origin][dest_city]:
-                    for flight_index in \
-                            self.graph[origin][dest_city][departure_date]:
+        stack: List[Iterator[int]] = [iter(first_flights)]
 
-                        # keeps track of vertices in current path
-                        visited_cities: Set[str] = set()
-                        visited_cities.add(origin)
+        while stack:
+            for flight_index in stack[-1]:
+                flight_destination = destinations[flight_index]
 
-                        self.__visit_all_vertices_util(destination,
-                                                       visited_cities,
-                                                       path_indices,
-                                                       flight_index)
+                # the flight has to go to a city we have not been to yet,
+                # allow the customer's bags and lead to the destination
+                if flight_destination in visited \
+                        or bags_allowed[flight_index] < bags \
+                        or not reaches[flight_index]:
+                    continue
 
-    def print_found_combinations(self) -> None:
-        sorted_list = sorted(self.flight_combinations.combinations,
-                             key=lambda x: x["total_price"])
-        print(dumps(sorted_list, indent=4))
+                path.append(flight_index)
 
-    def __seconds_to_midnight(self, current_time: datetime) -> int:
-        midnight = datetime.combine(current_time + timedelta(days=1), time())
-        return (midnight - current_time).seconds
+                if bounds is not None:
+                    price = self.__add_flight_price(prices[-1],
+                                                    flight_index,
+                                                    bags)
+                    # a path with the most flights is not extended below
+                    if not bounds.allows(path, price, True):
+                        path.pop()
+                        continue
 
-    def __next_day(self, date: datetime) -> datetime:
-        return date + timedelta(days=1)
+                if flight_destination in destination_ids:
+                    yield tuple(path)
 
-    def __datetime_to_int(self, time: datetime) -> int:
-        return int(time.strftime("%Y%m%d"))
-    
-    def __in_final_destination(self,
-                               final_destination: str,
-                               arrival_time: datetime,
-                               path: List[int]) -> None:
+                    if not to_many:
+                        path.pop()
+                        continue
 
-        if final_destination == self.destination:
-            # journey A -> B
-            if self.arrival is None or arrival_time > self.arrival:
-                self.flight_combinations.add_path(path, False)
+                if bounds is not None:
+                    if not bounds.can_extend(path):
+                        path.pop()
+                        continue
+                    prices.append(price)
 
-        elif final_destination == self.origin:
-            # return journey B -> A
-            if self.return_arrival is None or arrival_time \
-                        > self.return_arrival:
-                self.flight_combinations.add_path(path, True)
+                # from the city we are in right now, we have to look how
+                # to get to other cities - flights that comply with
+                # the arrival of the current flight
+                visited.add(flight_destination)
+                stack.append(iter(next_flights(flight_destination,
+                                               arrivals[flight_index])))
+                break
+            else:
+                # all flights following the last flight on path
+                # were tried, go one flight back
+                stack.pop()
+                if path:
+                    visited.remove(destinations[path.pop()])
+                    if bounds is not None:
+                        prices.pop()
+
+    def visit_all_vertices(self,
+                           origin: str,
+                           destination: str,
+                           query: Query,
+                           flight_combinations: FlightCombinations) -> None:
+        """
+        All paths from <origin> to <destination> are added
+        to <flight_combinations>
+        """
+        for path, is_return in self.iter_wanted_paths(origin,
+                                                      destination,
+                                                      query):
+            flight_combinations.add_path(path, is_return)
+
+    def iter_records(
+            self,
+            query: Query,
+            flight_combinations: Optional[FlightCombinations] = None
+    ) -> Iterator[Combination]:
+        """
+        Flight combinations of all journeys of <query> in the order
+        they are found, not formatted - see FlightCombinations.
+        """
+        if flight_combinations is None:
+            flight_combinations = self.new_combinations(query)
+
+        for origin, destination, _, _ in query.journeys():
+            for path, is_return in self.iter_wanted_paths(origin,
+                                                          destination,
+                                                          query):
+                yield flight_combinations.combination(path, is_return)
+
+    def iter_cheapest_paths(
+            self,
+            origin: str,
+            destination: str,
+            query: Query,
+            limit: Optional[int] = None
+    ) -> Iterator[Tuple[float, Tuple[int, ...]]]:
+        """
+        Yields paths from <origin> to <destination> (which arrive after
+        the soonest arrival) from the cheapest one together with their
+        total price. Paths with the same price are yielded in the same
+        order as iter_paths finds them.
+
+        Best first search - partial paths wait in a priority queue
+        ordered by their price, the cheapest one is extended first.
+        With <limit>, partial paths more expensive than the <limit>-th
+        cheapest path found so far are not extended at all.
+        """
+        journey = self.__journey(origin, destination, query)
+        if journey is None:
+            return
+
+        (_, _, _, soonest_arrival), origin_id, destination_id = journey
+
+        flights = self.flights
+        bags = query.bags
+        reaches = self.reachability(destination_id, query.layovers).reaches
+        bounds = query.search_bounds(flights)
+
+        # (price, positions of flights among the possible next flights,
+        # path, is the path complete) - positions make the order of
+        # paths with the same price the same as the order of iter_paths
+        queue: List[Tuple[float, Tuple[int, ...], Tuple[int, ...], bool]] = []
+
+        # prices of the <limit> cheapest complete paths found so far,
+        # as negative numbers - the most expensive one is on top
+        cheapest: List[float] = []
+
+        def push(price: float,
+                 positions: Tuple[int, ...],
+                 path: Tuple[int, ...]) -> None:
+            if limit is not None and len(cheapest) == limit \
+                    and price > -cheapest[0]:
+                # this path can not be among the <limit> cheapest ones
+                return
+
+            is_complete = flights.destination[path[-1]] == destination_id
+
+            if bounds is not None \
+                    and not bounds.allows(path, price, is_complete):
+                # neither the path nor its continuations are wanted
+                return
+
+            if is_complete:
+                if soonest_arrival is not None \
+                        and flights.arrival[path[-1]] <= soonest_arrival:
+                    return
+
+                if limit is not None:
+                    if len(cheapest) == limit:
+                        heapreplace(cheapest, -price)
+                    else:
+                        heappush(cheapest, -price)
 
-    def __add_next_day(self,
-                       arrival_time: datetime,
-                       flight_destination: str,
-                       new_destination: str,
-                       next_flights: List[int]) -> List[int]:
+            heappush(queue, (price, positions, path, is_complete))
 
-        next_day = self.__next_day(arrival_time)
+        next_flights = self.__counted_next_flights(query)
+        first_flights = self.__first_flights(origin_id, query)
+        if self.stats is not None:
+            self.stats.count_expanded(len(first_flights))
 
-        # in our graph, dates of the departures
-        # are stored as int
-        next_day_int = self.__datetime_to_int(next_day)
+        for position, flight_index in enumerate(first_flights):
+            if flights.bags_allowed[flight_index] >= bags \
+                    and reaches[flight_index]:
+                push(self.__add_flight_price(0.0, flight_index, bags),
+                     (position,),
+                     (flight_index,))
 
-        if next_day_int in self.graph[flight_destination][new_destination]:
-            next_flights += self.graph[flight_destination][new_destination][next_day_int]
+        while queue:
+            price, positions, path, is_complete = heappop(queue)
 
-        return next_flights
+            if is_complete:
+                yield price, path
+                continue
 
-    def __visit_all_vertices_util(self,
-                                  final_destination: str,
-                                  visited: Set[str],
-                                  path: List[int],
-                                  flight_index: int):
+            # airports we have already been to on this path
+            visited = {origin_id}
+            visited.update(flights.destination[index] for index in path)
+
+            last_flight = path[-1]
+            following = next_flights(flights.destination[last_flight],
+                                     flights.arrival[last_flight])
+
+            for position, flight_index in enumerate(following):
+                if flights.destination[flight_index] not in visited \
+                        and flights.bags_allowed[flight_index] >= bags \
+                        and reaches[flight_index]:
+                    push(self.__add_flight_price(price, flight_index, bags),
+                         positions + (position,),
+                         path + (flight_index,))
+
+    def iter_cheapest_combinations(self,
+                                   query: Query) -> Iterator[OrderedDict]:
+        """
+        The cheapest combinations of all journeys of <query> sorted
+        by price, at most query.limit of them. When the prices are
+        the same, journey A -> B goes first.
         """
-        Recursive helper function that visits vertices in the graph.
+        flight_combinations = self.new_combinations(query)
+        journeys_combinations = []
 
-        <path> stores indices of flights on path
+        for origin, destination, is_return, _ in query.journeys():
+            cheapest_paths = self.__counted_paths(self.iter_cheapest_paths(
+                origin, destination, query, query.limit))
+            journeys_combinations.append(flight_combinations.combinations_of(
+                (path for _, path in islice(cheapest_paths, query.limit)),
+                is_return))
+
+        # only the combinations which are returned are formatted
+        combinations = merge(*journeys_combinations,
+                             key=attrgetter("total_price"))
+        return flight_combinations.format_combinations(
+            islice(combinations, query.limit))
+
+    def iter_round_trips(
+            self,
+            query: Query,
+            records: Optional[Iterable[Combination]] = None
+    ) -> Iterator[OrderedDict]:
         """
-        current_flight: Flight = self.flights[flight_index]
+        Round trips of <query> sorted by their total price, at most
+        query.limit of them - see round_trips.py.
 
-        # get information about current flight
-        flight_destination: str = current_flight.flight_data["destination"]
-        arrival_time: datetime = current_flight.flight_data["arrival"]
-        arrival_date = self.__datetime_to_int(arrival_time)
+        :param records: combinations of both journeys of <query>,
+                        default = iter_records(query)
+        """
+        flight_combinations = self.new_combinations(query)
 
-        visited.add(flight_destination)
-        path.append(flight_index)
+        if records is None:
+            records = self.iter_records(query, flight_combinations)
+
+        outbound: List[Combination] = []
+        inbound: List[Combination] = []
+
+        for record in records:
+            if record.is_return:
+                inbound.append(record)
+            else:
+                outbound.append(record)
+
+        round_trips = cheapest_round_trips(outbound, inbound, self.flights)
+        return flight_combinations.format_round_trips(
+            islice(round_trips, query.limit))
+
+    def search_fastest(self, query: Query) -> List[OrderedDict]:
+        """
+        The earliest arriving combination of every journey of <query>,
+        or with query.per_departure the fastest combinations for their
+        departure (see fastest_paths_per_departure) ordered by departure.
+        """
+        flight_combinations = self.new_combinations(query)
+        records: List[Combination] = []
 
-        if flight_destination == final_destination:
+        for origin, destination, is_return, _ in query.journeys():
+            if query.per_departure:
+                paths = self.fastest_paths_per_departure(origin,
+                                                         destination,
+                                                         query)
+            else:
+                path = self.fastest_path(origin, destination, query)
+                paths = [] if path is None else [path]
+
+            records.extend(flight_combinations.combinations_of(paths,
+                                                               is_return))
+
+        return list(flight_combinations.format_combinations(records))
+
+    def fastest_path(self,
+                     origin: str,
+                     destination: str,
+                     query: Query) -> Optional[Tuple[int, ...]]:
+        """
+        Path from <origin> to <destination> which arrives the earliest
+        (after the soonest arrival), found by one scan of the flights -
+        see connection_scan.py, or by the exact search when the query
+        has bounds. None when there is no path.
+        """
+        journey = self.__journey(origin, destination, query)
+        if journey is None:
+            return None
+
+        (_, _, _, soonest_arrival), origin_id, destination_id = journey
+
+        if query.search_bounds(self.flights) is not None:
+            return self.__earliest_path(origin_id,
+                                        destination_id,
+                                        query,
+                                        soonest_arrival)
+
+        path = self.__connection_scan(destination_id,
+                                      query).earliest_arrival(
+            origin_id,
+            destination_id,
+            query.bags,
+            query.departure,
+            soonest_arrival)
+
+        if path is not None and not self.__is_simple(path):
+            # the scan went through an airport twice
+            path = self.__earliest_path(origin_id,
+                                        destination_id,
+                                        query,
+                                        soonest_arrival)
+
+        return path
+
+    def fastest_paths_per_departure(self,
+                                    origin: str,
+                                    destination: str,
+                                    query: Query) -> List[Tuple[int, ...]]:
+        """
+        The earliest arriving path for every departure from <origin>,
+        if no path departing later (or at the same time) arrives
+        at the same time or sooner - the fastest paths for their
+        departure, ordered by departure.
+        """
+        journey = self.__journey(origin, destination, query)
+        if journey is None:
+            return []
 
-            # we already checked that self.destination != self.origin
-            # we compare <arrival_time> to the soonest arrivals
-            # the customer has specified
+        (_, _, _, soonest_arrival), origin_id, destination_id = journey
 
-            self.__in_final_destination(flight_destination,
-                                        arrival_time,
-                                        path)
+        first_flights = self.__first_flights(origin_id, query)
 
+        if query.search_bounds(self.flights) is not None:
+            # the exact search finds the path of every first flight
+            paths = [self.__earliest_path(origin_id,
+                                          destination_id,
+                                          query,
+                                          soonest_arrival,
+                                          slice(position, position + 1))
+                     for position in range(len(first_flights))]
         else:
-            # we need to look for flights from destination of
-            # our current flight to other cities
-            for new_destination in self.graph[flight_destination]:
-                if new_destination not in visited:
-
-                    # are there any flights from this city this day?
-                    if arrival_date in \
-                            self.graph[flight_destination][new_destination]:
-                        next_flights = \
-                            self.graph[flight_destination][new_destination][arrival_date]
-                    else:
-                        next_flights = []
-
-                    # if there is less than 6 hours to midnight, we also need
-                    # to check for the flights the next day (as the layover
-                    # can be up to 6 hours)
-                    # 1 hour = 60 min * 60 seconds
-                    if self.__seconds_to_midnight(arrival_time) <= 6 * 3600:
-                        next_flights = self.__add_next_day(arrival_time,
-                                                           flight_destination,
-                                                           new_destination,
-                                                           next_flights)
-
-                    for fl_index in next_flights:
-                        possible_flight = self.flights[fl_index].flight_data
-                        possible_departure: datetime = possible_flight["departure"]
-
-                        layover_time: timedelta = \
-                            possible_departure - arrival_time
-                        layover_time_sec = layover_time.total_seconds()
-
-                        # we want the layover to be more than 1 hour
-                        # and less than 6 hours
-                        if 3600 < layover_time_sec < 6 * 3600:
-                            self.__visit_all_vertices_util(final_destination,
-                                                           visited,
-                                                           path,
-                                                           fl_index)
-
-        path.pop()
-        visited.remove(flight_destination)
+            paths = self.__connection_scan(
+                destination_id, query).arrival_profile(origin_id,
+                                                       destination_id,
+                                                       first_flights,
+                                                       query.bags,
+                                                       soonest_arrival)
+
+        # (departure, arrival, position of the first flight, path)
+        journeys: List[Tuple[int, int, int, Tuple[int, ...]]] = []
+
+        for position, path in enumerate(paths):
+            if path is not None and not self.__is_simple(path):
+                # the scan went through an airport twice
+                path = self.__earliest_path(origin_id,
+                                            destination_id,
+                                            query,
+                                            soonest_arrival,
+                                            slice(position, position + 1))
+
+            if path is not None:
+                journeys.append((self.flights.departure[path[0]],
+                                 self.flights.arrival[path[-1]],
+                                 position,
+                                 path))
+
+        # from the latest departure, a path is the fastest one when
+        # it arrives sooner than all paths departing later
+        journeys.sort(key=lambda journey: (-journey[0], journey[1:3]))
+
+        fastest: List[Tuple[int, ...]] = []
+        earliest_arrival: Optional[int] = None
+
+        for _, arrival, _, path in journeys:
+            if earliest_arrival is None or arrival < earliest_arrival:
+                fastest.append(path)
+                earliest_arrival = arrival
+
+        fastest.reverse()
+        return fastest
+
+    def search_pareto(self, query: Query) -> List[OrderedDict]:
+        """
+        Pareto optimal combinations of all journeys of <query> (see
+        pareto_search.py) sorted by price, when the prices are the same,
+        journey A -> B goes first.
+        """
+        flight_combinations = self.new_combinations(query)
+        records: List[Combination] = []
+
+        for origin, destination, is_return, _ in query.journeys():
+            records.extend(flight_combinations.combinations_of(
+                self.pareto_paths(origin, destination, query),
+                is_return))
+
+        records.sort(key=attrgetter("total_price"))
+        return list(flight_combinations.format_combinations(records))
+
+    def pareto_paths(self,
+                     origin: str,
+                     destination: str,
+                     query: Query) -> List[Tuple[int, ...]]:
+        """
+        Paths from <origin> to <destination> no other path beats
+        in price, travel time and number of flights.
+        """
+        journey = self.__journey(origin, destination, query)
+        if journey is None:
+            return []
+
+        (_, _, _, soonest_arrival), origin_id, destination_id = journey
+
+        first_flights = self.__first_flights(origin_id, query)
+        if self.stats is not None:
+            self.stats.count_expanded(len(first_flights))
+
+        return pareto_paths(self.flights,
+                            self.__counted_next_flights(query),
+                            partial(self.__add_flight_price,
+                                    bags=query.bags),
+                            self.reachability(destination_id,
+                                              query.layovers).reaches,
+                            origin_id,
+                            destination_id,
+                            first_flights,
+                            query.bags,
+                            soonest_arrival,
+                            query.search_bounds(self.flights),
+                            query.min_layover)
+
+    def airports_or_all(self,
+                        airports: Optional[Sequence[str]]) -> List[str]:
+        """<airports>, all airports of the graph sorted when None"""
+        if airports is None:
+            return sorted(self.flights.airports)
+        return list(airports)
+
+    def iter_paths_to_many(
+            self,
+            origin: str,
+            destinations: Iterable[str],
+            query: Optional[Query] = None) -> Iterator[Tuple[int, ...]]:
+        """
+        Yields all paths from <origin> to every one of <destinations>,
+        the same ones iter_paths yields for each of them (in the same
+        order), by one depth first search from the origin - a path
+        to a destination is continued to the other ones.
+        """
+        origin_id = self.flights.airport_ids.get(origin)
+        destination_ids = frozenset(
+            self.flights.airport_ids[destination]
+            for destination in destinations
+            if destination in self.flights.airport_ids
+            and destination != origin)
+
+        if origin_id is None or not destination_ids:
+            return iter(())
+
+        return self.__depth_first_paths(origin_id, destination_ids, query)
+
+    def __iter_wanted_paths_to_many(
+            self,
+            origin: str,
+            destinations: Sequence[str],
+            query: Query) -> Iterator[Tuple[str, Tuple[int, ...]]]:
+        """
+        Destinations and paths of iter_paths_to_many which arrive after
+        the soonest arrival the customer has specified.
+        """
+        airports = self.flights.airports
+        arrivals = self.flights.arrival
+        destination_of = self.flights.destination
+
+        paths = self.__counted_paths(
+            self.iter_paths_to_many(origin, destinations, query))
+
+        for path in paths:
+            if query.arrival is None or arrivals[path[-1]] > query.arrival:
+                yield airports[destination_of[path[-1]]], path
+
+    def search_destinations(self,
+                            query: Query,
+                            destinations: Optional[Sequence[str]] = None
+                            ) -> List[OrderedDict]:
+        """
+        Flight combinations from the origin of <query> to every one of
+        <destinations> (all airports when None) sorted by price, found
+        by one search from the origin. One item for every destination
+        other than the origin - the destination and its combinations.
+        """
+        destinations = [destination
+                        for destination in self.airports_or_all(destinations)
+                        if destination != query.origin]
+
+        flight_combinations = {
+            destination: FlightCombinations(destination,
+                                            query.origin,
+                                            query.bags,
+                                            self.flights,
+                                            self.flight_categories)
+            for destination in destinations}
+
+        for destination, path in self.__iter_wanted_paths_to_many(
+                query.origin, destinations, query):
+            flight_combinations[destination].add_path(path, False)
+
+        return [OrderedDict([
+            ("destination", destination),
+            ("combinations",
+             flight_combinations[destination].sorted_combinations())])
+            for destination in destinations]
+
+    def travel_matrix(self,
+                      query: Query,
+                      origins: Optional[Sequence[str]] = None,
+                      destinations: Optional[Sequence[str]] = None
+                      ) -> List[OrderedDict]:
+        """
+        The cheapest price and the shortest travel time from every one
+        of <origins> to every one of <destinations> (all airports when
+        None), see FlightCombinations.format_summary. One search from
+        every origin, reachability of the destinations is shared by all
+        of them.
+        """
+        destinations = self.airports_or_all(destinations)
+        matrix = []
+
+        for origin in self.airports_or_all(origins):
+            flight_combinations = {
+                destination: FlightCombinations(destination,
+                                                origin,
+                                                query.bags,
+                                                self.flights,
+                                                self.flight_categories)
+                for destination in destinations if destination != origin}
+
+            # the cheapest price and the shortest travel time found
+            cheapest: Dict[str, float] = dict()
+            shortest: Dict[str, int] = dict()
+
+            for destination, path in self.__iter_wanted_paths_to_many(
+                    origin, flight_combinations, query):
+                combination = flight_combinations[destination].combination(
+                    path, False)
+
+                if combination.total_price < cheapest.get(destination,
+                                                          float("inf")):
+                    cheapest[destination] = combination.total_price
+                if combination.travel_time < shortest.get(destination,
+                                                          float("inf")):
+                    shortest[destination] = combination.travel_time
+
+            for destination, combinations in flight_combinations.items():
+                matrix.append(combinations.format_summary(
+                    cheapest.get(destination), shortest.get(destination)))
+
+        return matrix
+
+    def __connection_scan(self,
+                          destination: int,
+                          query: Query) -> ConnectionScan:
+        return ConnectionScan(self.flights,
+                              self.departure_index,
+                              self.__get_departure_order(),
+                              self.reachability(destination,
+                                                query.layovers).reaches,
+                              *query.layovers)
+
+    def __is_simple(self, path: Sequence[int]) -> bool:
+        """Does the path visit every airport at most once?"""
+        airports = [self.flights.origin[path[0]]]
+        airports.extend(self.flights.destination[index] for index in path)
+        return len(set(airports)) == len(airports)
+
+    def __earliest_path(self,
+                        origin: int,
+                        destination: int,
+                        query: Query,
+                        soonest_arrival: Optional[int],
+                        first: Optional[slice] = None
+                        ) -> Optional[Tuple[int, ...]]:
+        """
+        Path from <origin> to <destination> (ids of the airports) which
+        arrives the earliest - exact, but slower than the connection
+        scan. See iter_paths for <first>.
+
+        Best first search - partial paths wait in a priority queue
+        ordered by arrival of their last flight, the earliest arriving
+        one is extended first. Paths over bounds of the query are not
+        extended, see search_bounds.py.
+        """
+        flights = self.flights
+        bags = query.bags
+        reaches = self.reachability(destination, query.layovers).reaches
+        next_flights = self.__counted_next_flights(query)
+        bounds = query.search_bounds(flights)
+
+        # (arrival, positions of flights among the possible next
+        # flights, path, price) - positions keep the order of iter_paths
+        queue: List[Tuple[int, Tuple[int, ...], Tuple[int, ...], float]] = []
+
+        def push(positions: Tuple[int, ...],
+                 path: Tuple[int, ...],
+                 price: float) -> None:
+            if bounds is None or bounds.allows(
+                    path,
+                    price,
+                    flights.destination[path[-1]] == destination):
+                heappush(queue, (flights.arrival[path[-1]],
+                                 positions,
+                                 path,
+                                 price))
+
+        first_flights = self.__first_flights(origin, query, first)
+
+        for position, flight_index in enumerate(first_flights):
+            if flights.destination[flight_index] != origin \
+                    and flights.bags_allowed[flight_index] >= bags \
+                    and reaches[flight_index]:
+                push((position,),
+                     (flight_index,),
+                     self.__add_flight_price(0.0, flight_index, bags))
+
+        while queue:
+            arrival, positions, path, price = heappop(queue)
+            airport = flights.destination[path[-1]]
+
+            if airport == destination:
+                if soonest_arrival is None or arrival > soonest_arrival:
+                    return path
+                continue
+
+            # airports we have already been to on this path
+            visited = {origin}
+            visited.update(flights.destination[index] for index in path)
+
+            for position, flight_index in enumerate(next_flights(airport,
+                                                                 arrival)):
+                if flights.destination[flight_index] not in visited \
+                        and flights.bags_allowed[flight_index] >= bags \
+                        and reaches[flight_index]:
+                    push(positions + (position,),
+                         path + (flight_index,),
+                         self.__add_flight_price(price, flight_index, bags))
+
+        return None
+
+    def __add_flight_price(self,
+                           price: float,
+                           flight_index: int,
+                           bags: int) -> float:
+        """
+        Adds price of the flight with the customer's bags to <price>,
+        the same way as FlightCombinations sums total price.
+        """
+        price += self.flights.base_price[flight_index]
+        price += self.flights.bag_price[flight_index] * bags
+        return price
+
+    def __journey(self,
+                  origin: str,
+                  destination: str,
+                  query: Query) -> Optional[Tuple[Journey, int, int]]:
+        """
+        Journey of <query> from <origin> to <destination> and ids
+        of both airports, None when there is no such journey or
+        the graph does not have one of the airports.
+        """
+        origin_id = self.flights.airport_ids.get(origin)
+        destination_id = self.flights.airport_ids.get(destination)
+
+        if origin_id is None or destination_id is None:
+            return None
+
+        for journey in query.journeys():
+            if journey[:2] == (origin, destination):
+                return journey, origin_id, destination_id
+        return None
+
+    def iter_wanted_paths(
+            self,
+            origin: str,
+            destination: str,
+            query: Query,
+            first: Optional[slice] = None
+    ) -> Iterator[Tuple[Tuple[int, ...], bool]]:
+        """
+        Paths from <origin> to <destination> which arrive after the
+        soonest arrival the customer has specified, together with
+        information whether the path is a return journey - see
+        iter_paths for <first>.
+        """
+        journey = self.__journey(origin, destination, query)
+        if journey is None:
+            return
+
+        (_, _, is_return, soonest_arrival), origin_id, destination_id = \
+            journey
+        arrivals = self.flights.arrival
+
+        paths = self.__counted_paths(
+            self.__depth_first_paths(origin_id,
+                                     frozenset((destination_id,)),
+                                     query,
+                                     first))
 
+        for path in paths:
+            # we compare arrival of the last flight to the soonest
+            # arrivals the customer has specified
+            if soonest_arrival is None or arrivals[path[-1]] > soonest_arrival:
+                yield path, is_return